@@ -1,6 +1,7 @@
 # https://hatch.pypa.io/latest/how-to/config/dynamic-metadata/
 import os
 import subprocess
+import sys
 import typing as t
 
 from hatchling.builders.hooks.plugin.interface import BuildHookInterface
@@ -13,6 +14,11 @@ class CustomBuildHook(BuildHookInterface):
     def initialize(self, version, build_data):
         # This runs before the build starts
         subprocess.check_call(["make", "scss"])
+        # Fingerprint and compress static files with the build environment, where
+        # brotli is installed
+        subprocess.check_call(
+            [sys.executable, "-m", "tutordeck.server.assets"], cwd=HERE
+        )
 
 
 class MetaDataHook(MetadataHookInterface):
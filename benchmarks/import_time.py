@@ -0,0 +1,161 @@
+# Measure the cost that the deck plugin adds to Tutor commands, when it is enabled.
+#
+# Every scenario is run in fresh interpreters, with and without importing the plugin
+# module, and with an empty project root, such that no other plugin is loaded. The
+# import time of the plugin module is collected with "python -X importtime".
+#
+# Usage:
+#
+#   python benchmarks/import_time.py [--runs=10] [--json=results.json]
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PLUGIN_MODULE = "tutordeck.plugin"
+
+SCENARIOS = {
+    # tutor --help
+    "help": "tutor.commands.cli.main()",
+    # Command that is run in-process, as in the deck worker processes
+    "command": "tutor.commands.cli.cli(['config', 'printroot'])",
+}
+
+# Code that is run by every interpreter. The tutor CLI is imported first, such that
+# the import time of the plugin only includes what the plugin adds to tutor.
+TEMPLATE = """
+import sys
+import tutor.commands.cli
+{plugin_import}
+sys.argv = ["tutor", "--help"]
+try:
+    {scenario}
+except SystemExit:
+    pass
+"""
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Measure the cost that the deck plugin adds to Tutor commands."
+    )
+    parser.add_argument("--runs", type=int, default=10, help="runs per measure")
+    parser.add_argument("--json", default="", help="save results to this file")
+    args = parser.parse_args()
+
+    results: dict[str, dict[str, float]] = {}
+    with tempfile.TemporaryDirectory() as root:
+        for name, scenario in SCENARIOS.items():
+            baseline = measure(root, scenario, "", args.runs)
+            with_plugin = measure(root, scenario, f"import {PLUGIN_MODULE}", args.runs)
+            import_times = parse_import_times(root, scenario)
+            results[name] = {
+                "baseline_ms": baseline,
+                "with_plugin_ms": with_plugin,
+                "added_ms": with_plugin - baseline,
+                "plugin_import_ms": plugin_import_time(import_times),
+            }
+        heaviest = heaviest_imports(parse_import_times(root, SCENARIOS["help"]))
+
+    print(f"{'':<10}{'baseline':>12}{'with plugin':>14}{'added':>12}{'import':>12}")
+    for name, result in results.items():
+        print(
+            f"{name:<10}"
+            f"{result['baseline_ms']:>10.1f}ms"
+            f"{result['with_plugin_ms']:>12.1f}ms"
+            f"{result['added_ms']:>10.1f}ms"
+            f"{result['plugin_import_ms']:>10.1f}ms"
+        )
+    print(f"\nSlowest imports of {PLUGIN_MODULE}:")
+    for module, duration in heaviest:
+        print(f"{duration:>10.1f}ms {module}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+def measure(root: str, scenario: str, plugin_import: str, runs: int) -> float:
+    """
+    Return the median wall-clock time of a scenario, in milliseconds.
+    """
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        run(root, scenario, plugin_import)
+        durations.append((time.perf_counter() - start) * 1000)
+    return statistics.median(durations)
+
+
+def parse_import_times(root: str, scenario: str) -> list[tuple[int, str, float]]:
+    """
+    Return the (depth, module, cumulative milliseconds) of all the imports of a
+    scenario, with the plugin. Modules are listed after the modules that they import.
+    """
+    output = run(root, scenario, f"import {PLUGIN_MODULE}", importtime=True)
+    import_times = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _self, cumulative, module = line[len("import time:") :].split("|")
+        # Nested imports are indented by two spaces
+        depth = (len(module) - len(module.lstrip()) - 1) // 2
+        import_times.append((depth, module.strip(), int(cumulative) / 1000))
+    return import_times
+
+
+def plugin_import_time(import_times: list[tuple[int, str, float]]) -> float:
+    """
+    Return the cumulative import time of the plugin module, in milliseconds.
+    """
+    for _depth, module, duration in import_times:
+        if module == PLUGIN_MODULE:
+            return duration
+    return 0.0
+
+
+def heaviest_imports(
+    import_times: list[tuple[int, str, float]], count: int = 10
+) -> list[tuple[str, float]]:
+    """
+    Return the modules that are directly imported by the plugin module, and that take
+    the longest to import.
+    """
+    imports: list[tuple[str, float]] = []
+    plugin_depth = None
+    for depth, module, duration in reversed(import_times):
+        if plugin_depth is None:
+            if module == PLUGIN_MODULE:
+                plugin_depth = depth
+        elif depth <= plugin_depth:
+            break
+        elif depth == plugin_depth + 1:
+            imports.append((module, duration))
+    return sorted(imports, key=lambda item: -item[1])[:count]
+
+
+def run(root: str, scenario: str, plugin_import: str, importtime: bool = False) -> str:
+    """
+    Run a scenario in a fresh interpreter, and return its standard error.
+    """
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    code = TEMPLATE.format(plugin_import=plugin_import, scenario=scenario)
+    result = subprocess.run(
+        command + ["-c", code],
+        env=dict(os.environ, TUTOR_ROOT=root),
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    return result.stderr
+
+
+if __name__ == "__main__":
+    main()
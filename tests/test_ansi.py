@@ -0,0 +1,27 @@
+import unittest
+
+from tutordeck.server.ansi import AnsiToHtml
+
+
+class AnsiToHtmlTests(unittest.TestCase):
+    def test_chunk_ends_with_crlf(self) -> None:
+        converter = AnsiToHtml()
+        self.assertEqual("line 1\n", converter.feed("line 1\r\n"))
+        self.assertEqual("line 2\n", converter.feed("line 2\n"))
+
+    def test_chunk_ends_with_carriage_return(self) -> None:
+        converter = AnsiToHtml()
+        self.assertEqual("line", converter.feed("line\r"))
+        self.assertEqual("\n", converter.feed("\n"))
+
+    def test_chunk_ends_with_incomplete_escape_sequence(self) -> None:
+        converter = AnsiToHtml()
+        self.assertEqual("a", converter.feed("a\x1b["))
+        self.assertEqual('<span class="bold">b</span>', converter.feed("1mb"))
+
+    def test_pending_size(self) -> None:
+        converter = AnsiToHtml()
+        converter.feed("a\x1b[3")
+        self.assertEqual(3, converter.pending_size)
+        converter.feed("1mb")
+        self.assertEqual(0, converter.pending_size)
@@ -0,0 +1,24 @@
+import os
+import tempfile
+import unittest
+
+from tutordeck.server import assets
+
+
+class NegotiateEncodingTests(unittest.TestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "deck.js")
+        for path in [self.path, self.path + ".gz"]:
+            with open(path, "wb") as f:
+                f.write(b"content")
+
+    def test_accepted_variant(self) -> None:
+        self.assertEqual("gzip", assets.negotiate_encoding(self.path, {"gzip"}))
+        self.assertEqual("", assets.negotiate_encoding(self.path, {"br"}))
+
+    def test_stale_variant(self) -> None:
+        mtime = os.path.getmtime(self.path)
+        os.utime(self.path + ".gz", (mtime - 10, mtime - 10))
+        self.assertEqual("", assets.negotiate_encoding(self.path, {"gzip"}))
@@ -0,0 +1,56 @@
+import unittest
+
+import click
+import click.shell_completion
+
+from tutordeck.server.completion import CompletionEngine
+
+
+class CountingParamType(click.ParamType):
+    name = "counting"
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def shell_complete(
+        self, ctx: click.Context, param: click.Parameter, incomplete: str
+    ) -> list[click.shell_completion.CompletionItem]:
+        self.calls += 1
+        return [click.shell_completion.CompletionItem(ctx.find_root().obj)]
+
+
+class CompletionEngineTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.param_type = CountingParamType()
+
+        @click.group()
+        def cli() -> None:
+            pass
+
+        @cli.command()
+        @click.option("--mode", type=click.Choice(["fast", "slow"]))
+        @click.option("-v", "--verbose", is_flag=True)
+        @click.argument("value", type=self.param_type)
+        def run(mode: str, verbose: bool, value: str) -> None:
+            pass
+
+        self.engine = CompletionEngine(cli, click.Context(cli, obj="dynamic"))
+
+    def test_static_completions(self) -> None:
+        self.assertEqual(["run"], [c["text"] for c in self.engine.complete("r")])
+        self.assertEqual(
+            ["fast", "slow"], [c["text"] for c in self.engine.complete("run --mode ")]
+        )
+
+    def test_dynamic_completions_are_not_cached(self) -> None:
+        for _ in range(2):
+            self.assertEqual(
+                ["dynamic"], [c["text"] for c in self.engine.complete("run ")]
+            )
+        self.assertEqual(2, self.param_type.calls)
+
+    def test_command_path(self) -> None:
+        self.assertEqual(
+            ["run", "value"],
+            self.engine.command_path(["run", "--mode", "fast", "-v", "value"]),
+        )
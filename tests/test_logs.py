@@ -0,0 +1,58 @@
+import asyncio
+import typing as t
+import unittest
+
+from tutordeck.server.logs import LogChunk, iter_batches
+
+
+async def iter_chunks(
+    chunks: list[LogChunk], delay: float = 0
+) -> t.AsyncIterator[LogChunk]:
+    for chunk in chunks:
+        await asyncio.sleep(delay)
+        yield chunk
+
+
+class IterBatchesTests(unittest.IsolatedAsyncioTestCase):
+    async def test_batches(self) -> None:
+        chunks = [
+            LogChunk("a", "1", 1),
+            LogChunk("a", "2", 2),
+            LogChunk("b", "3", 1),
+        ]
+        batches = [
+            batch
+            async for batch in iter_batches(
+                iter_chunks(chunks), max_bytes=1024, max_delay=1
+            )
+        ]
+        self.assertEqual([LogChunk("a", "12", 2), LogChunk("b", "3", 1)], batches)
+
+    async def test_no_chunk_is_lost_on_timeout(self) -> None:
+        chunks = [LogChunk("a", str(index), index) for index in range(20)]
+        batches = [
+            batch
+            async for batch in iter_batches(
+                iter_chunks(chunks, delay=0.001), max_bytes=1024, max_delay=0.001
+            )
+        ]
+        self.assertEqual(
+            "".join(chunk.text for chunk in chunks),
+            "".join(batch.text for batch in batches),
+        )
+
+    async def test_close(self) -> None:
+        closed = asyncio.Event()
+
+        async def endless() -> t.AsyncIterator[LogChunk]:
+            try:
+                while True:
+                    yield LogChunk("a", "x", 1)
+                    await asyncio.sleep(0.01)
+            finally:
+                closed.set()
+
+        batches = iter_batches(endless(), max_bytes=1, max_delay=1)
+        await batches.__anext__()
+        await batches.aclose()
+        self.assertTrue(closed.is_set())
@@ -0,0 +1,31 @@
+import unittest
+
+from tutor.plugins.indexes import IndexEntry
+
+from tutordeck.server.store import SearchIndex
+
+
+def make_entry(name: str, description: str) -> IndexEntry:
+    return IndexEntry({"name": name, "description": description, "author": ""})
+
+
+class SearchIndexTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.index = SearchIndex(
+            [
+                make_entry("mfe", "Micro-frontends for Open edX"),
+                make_entry("forum", "Discussion forum for openedx"),
+            ]
+        )
+
+    def search(self, query: str) -> list[str]:
+        return [entry.name for entry in self.index.search(query)]
+
+    def test_all_tokens_match(self) -> None:
+        self.assertEqual(["mfe"], self.search("micro fr"))
+        self.assertEqual(["mfe", "forum"], self.search(""))
+        self.assertEqual([], self.search("micro missing"))
+
+    def test_substring(self) -> None:
+        self.assertEqual(["mfe", "forum"], self.search("edx"))
+        self.assertEqual(["forum"], self.search("penedx"))
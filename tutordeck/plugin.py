@@ -1,11 +1,12 @@
 from __future__ import annotations
 
+import os
+
 import click
 from tutor import hooks
 from tutor.commands.context import Context
 
 from .__about__ import __version__
-from .server import app
 
 ########################################
 # CONFIGURATION
@@ -32,12 +33,53 @@ def deck() -> None:
     "--dev/--no-dev",
     help="Enable development mode, with auto-reload and debug templates.",
 )
+@click.option(
+    "--isolated/--no-isolated",
+    help=(
+        "Run Tutor commands in separate worker processes, which do not modify the "
+        "state of the server and can be reliably stopped."
+    ),
+)
+@click.option(
+    "-w",
+    "--workers",
+    default=1,
+    type=click.IntRange(min=1),
+    show_default=True,
+    help=(
+        "Number of server processes. Processes share commands and logs, such that "
+        "requests can be served by any of them. Ignored in development mode."
+    ),
+)
 @click.pass_obj
-def deck_runserver(obj: Context, host: str, port: int, dev: bool) -> None:
+def deck_runserver(
+    obj: Context, host: str, port: int, dev: bool, isolated: bool, workers: int
+) -> None:
     """
     Run the deck server.
     """
-    app.run(obj.root, host=host, port=port, debug=dev, use_reloader=dev)
+    if workers > 1 and not dev and os.name != "posix":
+        # Workers coordinate with file locks, which are only available on POSIX
+        raise click.BadParameter(
+            "multiple workers are only supported on POSIX platforms",
+            param_hint="--workers",
+        )
+    # The server is only imported when it runs, such that the plugin does not slow
+    # down other tutor commands.
+    # pylint: disable=import-outside-toplevel
+    from .server import app
+
+    if dev:
+        app.run(
+            obj.root,
+            isolated=isolated,
+            host=host,
+            port=port,
+            debug=True,
+            use_reloader=True,
+        )
+    else:
+        app.serve(obj.root, isolated=isolated, host=host, port=port, workers=workers)
 
 
 hooks.Filters.CLI_COMMANDS.add_item(deck)
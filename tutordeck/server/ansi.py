@@ -0,0 +1,166 @@
+import html
+import re
+import typing as t
+
+# Escape sequences, carriage returns and newlines. Only SGR sequences ("...m") are
+# converted: other sequences, such as cursor movements, are dropped.
+TOKEN_PATTERN = re.compile(r"\x1b\[([0-9;?]*)([ -/]*[@-~])|\x1b[@-Z\\-_]|\r\n|\r|\n")
+# Content at the end of a chunk that might be completed by the next chunk
+INCOMPLETE_PATTERN = re.compile(r"\x1b(?:\[[0-9;?]*[ -/]*)?\Z|\r\Z")
+
+# SGR attributes, indexed by code, and the codes that reset them
+ATTRIBUTES = {1: "bold", 2: "dim", 3: "italic", 4: "underline"}
+RESET_ATTRIBUTES = {22: ("bold", "dim"), 23: ("italic",), 24: ("underline",)}
+
+
+class AnsiToHtml:
+    """
+    Convert terminal output to HTML, one chunk at a time.
+
+    The converter is stateful: styles and incomplete escape sequences carry over from
+    one chunk to the next. Styled text is wrapped in spans with compact CSS classes
+    (e.g: "fg1 bold"), and spans never extend beyond a line, such that the output can
+    be split on newlines.
+
+    Lines that are rewritten with carriage returns, such as progress bars, are collapsed
+    into their final content. When a line that was already emitted in a previous chunk
+    is rewritten, the output contains a "\\r" character, which means that the content of
+    the current line should be discarded.
+    """
+
+    def __init__(self) -> None:
+        self.attributes: set[str] = set()
+        # Colors are either palette indices, for the 16 standard colors, or "#rrggbb"
+        self.foreground: t.Optional[str] = None
+        self.background: t.Optional[str] = None
+        self._pending = ""
+        self._open_tag = ""
+        # True if content of the current line was emitted in a previous chunk
+        self._line_emitted = False
+
+    @property
+    def pending_size(self) -> int:
+        """
+        Size, in bytes, of the content that was fed but not converted yet, because it
+        might be completed by the next chunk.
+        """
+        return len(self._pending.encode())
+
+    def feed(self, text: str) -> str:
+        """
+        Convert a chunk of text to HTML.
+        """
+        text = self._pending + text
+        if incomplete := INCOMPLETE_PATTERN.search(text):
+            text, self._pending = text[: incomplete.start()], text[incomplete.start() :]
+        else:
+            self._pending = ""
+        output: list[str] = []
+        # Output of the current line
+        line: list[str] = []
+        position = 0
+        for match in TOKEN_PATTERN.finditer(text):
+            self._add_text(line, text[position : match.start()])
+            position = match.end()
+            token = match.group()
+            if token in ("\n", "\r\n"):
+                output.extend(line)
+                output.append("\n")
+                line = []
+                self._line_emitted = False
+            elif token == "\r":
+                # Rewritten line: discard its content
+                line = ["\r"] if self._line_emitted else []
+            elif match.group(2) == "m":
+                self._set_style(match.group(1))
+        self._add_text(line, text[position:])
+        if line:
+            output.extend(line)
+            self._line_emitted = True
+        return "".join(output)
+
+    def _add_text(self, line: list[str], text: str) -> None:
+        if not text:
+            return
+        text = html.escape(text, quote=False)
+        line.append(f"{self._open_tag}{text}</span>" if self._open_tag else text)
+
+    def _set_style(self, parameters: str) -> None:
+        codes = [int(code) if code.isdigit() else 0 for code in parameters.split(";")]
+        while codes:
+            code = codes.pop(0)
+            if code == 0:
+                self.attributes.clear()
+                self.foreground = self.background = None
+            elif code in ATTRIBUTES:
+                self.attributes.add(ATTRIBUTES[code])
+            elif code in RESET_ATTRIBUTES:
+                self.attributes.difference_update(RESET_ATTRIBUTES[code])
+            elif 30 <= code <= 37:
+                self.foreground = str(code - 30)
+            elif 90 <= code <= 97:
+                self.foreground = str(code - 90 + 8)
+            elif 40 <= code <= 47:
+                self.background = str(code - 40)
+            elif 100 <= code <= 107:
+                self.background = str(code - 100 + 8)
+            elif code == 39:
+                self.foreground = None
+            elif code == 49:
+                self.background = None
+            elif code == 38:
+                self.foreground = pop_extended_color(codes)
+            elif code == 48:
+                self.background = pop_extended_color(codes)
+        self._open_tag = self._make_open_tag()
+
+    def _make_open_tag(self) -> str:
+        classes = sorted(self.attributes)
+        styles = []
+        for prefix, css_property, color in [
+            ("fg", "color", self.foreground),
+            ("bg", "background-color", self.background),
+        ]:
+            if color is None:
+                continue
+            if color.startswith("#"):
+                styles.append(f"{css_property}:{color}")
+            else:
+                classes.append(f"{prefix}{color}")
+        if not classes and not styles:
+            return ""
+        tag = "<span"
+        if classes:
+            tag += f' class="{" ".join(classes)}"'
+        if styles:
+            tag += f' style="{";".join(styles)}"'
+        return tag + ">"
+
+
+def pop_extended_color(codes: list[int]) -> t.Optional[str]:
+    """
+    Parse 256-color ("5;n") and true color ("2;r;g;b") parameters.
+    """
+    if len(codes) >= 2 and codes[0] == 5:
+        index = min(codes[1], 255)
+        del codes[:2]
+        if index < 16:
+            return str(index)
+        if index < 232:
+            # 6x6x6 color cube
+            index -= 16
+            levels = [0 if i == 0 else 55 + 40 * i for i in range(6)]
+            red, green, blue = (
+                levels[index // 36],
+                levels[index // 6 % 6],
+                levels[index % 6],
+            )
+            return f"#{red:02x}{green:02x}{blue:02x}"
+        gray = 8 + 10 * (index - 232)
+        return f"#{gray:02x}{gray:02x}{gray:02x}"
+    if len(codes) >= 4 and codes[0] == 2:
+        red, green, blue = (min(255, value) for value in codes[1:4])
+        del codes[:4]
+        return f"#{red:02x}{green:02x}{blue:02x}"
+    codes.clear()
+    return None
@@ -1,56 +1,130 @@
 import asyncio
+import contextlib
+import hashlib
+import itertools
 import json
 import logging
+import mimetypes
+import os
+import re
 import sys
 import typing as t
 
-import importlib_metadata
-from markdown import markdown
+import hypercorn.config
+import hypercorn.run
 from quart import (
     Quart,
     Response,
-    g,
     jsonify,
     make_response,
     redirect,
     render_template,
     request,
+    send_file,
     url_for,
 )
 from quart.typing import ResponseTypes
+from werkzeug.exceptions import NotFound
 from werkzeug.sansio.response import Response as BaseResponse
-from tutor.plugins.v1 import discover_package
+from werkzeug.security import safe_join
+
+from tutordeck.__about__ import __version__
+from tutordeck.server.utils import paginate
+
+from . import (
+    ansi,
+    assets,
+    completion,
+    constants,
+    coordination,
+    fragments,
+    history,
+    logs,
+    logsearch,
+    logstore,
+    tutorclient,
+    worker,
+)
 
-from tutordeck.server.utils import current_page_plugins, pagination_context
 
-from . import constants, tutorclient
+# Static files are served by the `static_file` view
+app = Quart(__name__, static_folder=None)
 
 
-app = Quart(
-    __name__,
-    static_url_path="/static",
-    static_folder="static",
-)
+def run(root: str, isolated: bool = False, **app_kwargs: t.Any) -> None:
+    """
+    Bootstrap the Quart app and run it with the development server.
+    """
+    setup(root, isolated=isolated)
+    app.run(**app_kwargs)
+
+
+def serve(
+    root: str,
+    isolated: bool = False,
+    host: str = "127.0.0.1",
+    port: int = 3274,
+    workers: int = 1,
+) -> None:
+    """
+    Run the app with the Hypercorn ASGI server, in production.
+
+    With more than one worker, every worker is a separate process that imports the app
+    from the asgi module. Workers share jobs, logs and state through the project root
+    (see the coordination module), such that any worker can serve any request.
+    """
+    config = hypercorn.config.Config()
+    config.bind = [f"{host}:{port}"]
+    if workers > 1:
+        # Worker processes are configured from the environment
+        os.environ["TUTOR_ROOT"] = root
+        os.environ[constants.ISOLATED_ENV_VAR] = "1" if isolated else ""
+        config.application_path = "tutordeck.server.asgi:app"
+        config.workers = workers
+        # Daemon processes are not allowed to start command workers
+        config.daemon = False
+    else:
+        setup(root, isolated=isolated)
+        config.application_path = f"{__name__}:app"
+        # Serve from the current process
+        config.workers = 0
+    hypercorn.run.run(config)
 
 
-def run(root: str, **app_kwargs: t.Any) -> None:
+def setup(root: str, isolated: bool = False, shared: bool = False) -> None:
     """
-    Bootstrap the Quart app and run it.
+    Bootstrap the Quart app.
+
+    In isolated mode, Tutor commands are run in worker processes. In shared mode, the
+    app is one of the processes of a multi-worker server, and coordinates with the
+    other processes.
     """
     tutorclient.Project.connect(root)
+    tutorclient.CliPool.USE_WORKERS = isolated
+
+    # Persist command history and logs in the project root
+    data_dir = os.path.join(root, constants.DATA_DIRNAME)
+    logstore.LogStore.DIRECTORY = os.path.join(data_dir, "logs")
+    history.History.connect(os.path.join(data_dir, "history.sqlite"))
 
     # Configure logging
     formatter = logging.Formatter("%(name)s - %(levelname)s - %(message)s")
     handler = logging.StreamHandler(sys.stdout)
     handler.setFormatter(formatter)
-    tutorclient.logger.addHandler(handler)
-    tutorclient.logger.setLevel(logging.INFO)
+    logger = logging.getLogger(__package__)
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
 
     # Configure authentication
     HttpAuthCredentials.load_credentials()
 
-    # TODO app.run() should be called only in development
-    app.run(**app_kwargs)
+    if shared:
+        coordination.Coordinator.enable(os.path.join(data_dir, "locks"))
+        coordination.Coordinator.add_poller(tutorclient.CliPool.sync_remote_jobs)
+        coordination.Coordinator.subscribe("plugins", tutorclient.on_plugins_changed)
+        coordination.Coordinator.subscribe(
+            "config", HttpAuthCredentials.load_credentials
+        )
 
 
 class HttpAuthCredentials:
@@ -101,14 +175,49 @@ def http_basic_auth() -> t.Optional[tuple[str, int, dict[str, str]]]:
     return None
 
 
-@app.before_request
-async def before_request() -> None:
+@app.url_defaults
+def fingerprint_static_urls(endpoint: str, values: dict[str, t.Any]) -> None:
     """
-    Store installed and enabled plugins as global attributes.
+    Point static URLs to fingerprinted files. This is disabled in debug mode, where
+    static files are modified without rebuilding the manifest.
     """
-    # Shared views and template context
-    g.installed_plugins = tutorclient.Client.installed_plugins()
-    g.enabled_plugins = tutorclient.Client.enabled_plugins()
+    if endpoint == "static" and "filename" in values and not app.debug:
+        values["filename"] = assets.StaticAssets.fingerprint(values["filename"])
+
+
+@app.get("/static/<path:filename>", endpoint="static")
+async def static_file(filename: str) -> Response:
+    """
+    Serve static files, or their precompressed variants if the client accepts them.
+
+    Fingerprinted files never change, so that browsers may cache them forever. Other
+    files must be revalidated on every request.
+    """
+    source, is_fingerprinted = assets.StaticAssets.resolve(filename)
+    path = safe_join(assets.StaticAssets.DIRECTORY, source)
+    if path is None or not os.path.isfile(path):
+        raise NotFound()
+    is_immutable = is_fingerprinted and not app.debug
+    # In debug mode, files are edited in place and their variants are not rebuilt
+    encoding = (
+        ""
+        if app.debug
+        else assets.negotiate_encoding(path, set(request.accept_encodings.values()))
+    )
+    response = await send_file(
+        path + assets.ENCODINGS.get(encoding, ""),
+        mimetype=mimetypes.guess_type(source)[0] or "application/octet-stream",
+        cache_timeout=constants.STATIC_MAX_AGE_SECONDS if is_immutable else 0,
+        conditional=True,
+    )
+    if encoding:
+        response.content_encoding = encoding
+    response.vary.add("Accept-Encoding")
+    if is_immutable:
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
 
 
 @app.get("/")
@@ -176,8 +285,48 @@ async def plugin_installed() -> str:
 
 
 @app.get("/plugin/store/list")
-async def plugin_store_list() -> str:
+async def plugin_store_list() -> Response:
+    """
+    Search for plugins in the store, and display a single page of results.
+
+    View models are only built for the plugins of the current page. Nothing is
+    rendered if the client already has the current page, or if it was already rendered.
+    """
     search_query = request.args.get("search", "")
+    current_page = request.args.get("page", 1, type=int)
+    page_size = request.args.get("page_size", constants.ITEMS_PER_PAGE, type=int)
+
+    await tutorclient.Client.ensure_store()
+    store_snapshot = tutorclient.Client.store()
+    plugins_generation = tutorclient.Client.PLUGINS_GENERATION
+    installed_plugins = tutorclient.Client.installed_plugins()
+    enabled_plugins = tutorclient.Client.enabled_plugins()
+    etag = fragment_etag(
+        "_plugin_store_list.html",
+        store_snapshot.stamp,
+        installed_plugins,
+        enabled_plugins,
+    )
+    if response := not_modified(etag):
+        return response
+    cache_key = (
+        "_plugin_store_list.html",
+        search_query,
+        current_page,
+        page_size,
+        store_snapshot.stamp,
+        plugins_generation,
+    )
+    if (fragment := get_cached_fragment(cache_key)) is not None:
+        return fragment_response(etag, fragment)
+
+    page_entries, pagination = paginate(
+        store_snapshot.search_index.search(search_query),
+        current_page,
+        page_size,
+    )
+    pagination["total"] = len(store_snapshot.entries)
+
     plugins: list[dict[str, t.Any]] = [
         {
             "name": p.name,
@@ -185,26 +334,24 @@ async def plugin_store_list() -> str:
             "index": p.index,
             "author": tutorclient.Client.get_plugin_author(p),
             "description": p.short_description,
-            "is_installed": p.name in g.installed_plugins,
-            "is_enabled": p.name in g.enabled_plugins,
+            "is_installed": p.name in installed_plugins,
+            "is_enabled": p.name in enabled_plugins,
         }
-        for p in tutorclient.Client.plugins_in_store()
-        if p.name in tutorclient.Client.plugins_matching_pattern(search_query)
+        for p in page_entries
     ]
 
-    current_page = int(request.args.get("page", "1"))
-    plugins = current_page_plugins(plugins, current_page)
-    pagination = pagination_context(plugins, current_page)
-
-    return await render_template(
+    fragment = await render_cached_template(
+        cache_key,
         "_plugin_store_list.html",
         plugins=plugins,
         pagination=pagination,
+        search_query=search_query,
     )
+    return fragment_response(etag, fragment)
 
 
 @app.get("/plugin/installed/list")
-async def plugin_installed_list() -> str:
+async def plugin_installed_list() -> Response:
     """
     Search for installed plugins that match a certain query.
 
@@ -216,24 +363,38 @@ async def plugin_installed_list() -> str:
       That's because some installed plugins don't have any description.
     """
     search_query = request.args.get("search", "").lower()
+    await tutorclient.Client.ensure_store()
+    store_snapshot = tutorclient.Client.store()
+    plugins_generation = tutorclient.Client.PLUGINS_GENERATION
+    installed_plugins = tutorclient.Client.installed_plugins()
+    enabled_plugins = tutorclient.Client.enabled_plugins()
+    etag = fragment_etag(
+        "_plugin_installed_list.html",
+        store_snapshot.stamp,
+        installed_plugins,
+        enabled_plugins,
+    )
+    if response := not_modified(etag):
+        return response
+    cache_key = (
+        "_plugin_installed_list.html",
+        search_query,
+        store_snapshot.stamp,
+        plugins_generation,
+    )
+    if (fragment := get_cached_fragment(cache_key)) is not None:
+        return fragment_response(etag, fragment)
 
     # Search for plugins
     # Note that in most cases the search argument is empty.
     # Note also that this is slightly different than store search. That's because some
     # installed plugins may not be present in the store.
     plugins_found = []
-    for name in g.installed_plugins:
+    for name in installed_plugins:
         # Simple pattern matching
         if search_query in name.lower() or not search_query:
             plugins_found.append(name)
 
-    # Match with plugins in store
-    store_plugins = {
-        p.name: p
-        for p in tutorclient.Client.plugins_in_store()
-        if p.name in plugins_found
-    }
-
     # Collect results
     plugins: list[dict[str, t.Any]] = []
     for name in plugins_found:
@@ -241,86 +402,161 @@ async def plugin_installed_list() -> str:
             "name": name,
             "author": "",
             "description": "",
-            "is_enabled": name in g.enabled_plugins,
+            "is_enabled": name in enabled_plugins,
         }
-        if store_plugin := store_plugins.get(name):
+        # Match with plugins in store
+        if store_plugin := store_snapshot.by_name.get(name):
             result["description"] = store_plugin.short_description
             result["author"] = tutorclient.Client.get_plugin_author(store_plugin)
         plugins.append(result)
 
-    return await render_template(
-        "_plugin_installed_list.html",
-        plugins=plugins,
+    fragment = await render_cached_template(
+        cache_key, "_plugin_installed_list.html", plugins=plugins
     )
+    return fragment_response(etag, fragment)
+
+
+def fragment_etag(*values: t.Any) -> str:
+    """
+    Compute the ETag of an HTML fragment from the JSON-serializable values that it is
+    rendered from, such that the ETag can be checked before rendering. ETags are the
+    same in all the processes of a multi-worker server.
+
+    Templates are modified without restarting the server in debug mode, so an empty
+    ETag is returned, which disables conditional requests.
+    """
+    if app.debug:
+        return ""
+    payload = json.dumps(
+        [__version__, assets.StaticAssets.digest(), *values], separators=(",", ":")
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+
+def not_modified(etag: str) -> t.Optional[Response]:
+    """
+    Return a "304 Not Modified" response if the client already has the current version
+    of the requested resource.
+    """
+    if not etag or not request.if_none_match.contains(etag):
+        return None
+    response = Response("", status=304)
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
+
+
+def get_cached_fragment(cache_key: t.Hashable) -> t.Optional[bytes]:
+    """
+    Return a rendered fragment from the cache. Templates are modified without restarting
+    the server in debug mode, so nothing is cached.
+    """
+    if app.debug:
+        return None
+    return fragments.FragmentCache.get(cache_key)
+
+
+async def render_cached_template(
+    cache_key: t.Hashable, template: str, **context: t.Any
+) -> bytes:
+    """
+    Render a template, and cache the result. The cache key must identify the state
+    that the context was computed from.
+    """
+    fragment = (await render_template(template, **context)).encode()
+    if not app.debug:
+        fragments.FragmentCache.set(cache_key, fragment)
+    return fragment
+
+
+def fragment_response(etag: str, fragment: bytes) -> Response:
+    """
+    Serve an HTML fragment that clients must revalidate on every request.
+    """
+    response = Response(fragment, content_type="text/html")
+    if etag:
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+    return response
 
 
 @app.get("/plugin/<name>")
 async def plugin(name: str) -> Response:
-    index_entry = tutorclient.Client.plugin_in_store(name)
+    """
+    Display the plugin page, which is cached until the plugin store, the configuration
+    or the enabled plugins are modified.
+    """
+    await tutorclient.Client.ensure_store()
+    store_snapshot = tutorclient.Client.store()
+    plugins_generation = tutorclient.Client.PLUGINS_GENERATION
+    config_generation = tutorclient.Project.config_generation()
+    index_entry = store_snapshot.by_name.get(name)
+    is_installed = name in tutorclient.Client.installed_plugins()
 
     # Plugin must either be installed or available in the store
-    if not index_entry and name not in g.installed_plugins:
+    if not index_entry and not is_installed:
         return Response("Plugin not found", status=404)
 
-    description = markdown(index_entry.description) if index_entry else ""
-    rendered_template = await render_template(
+    cache_key = (
         "plugin.html",
-        plugin_name=name,
-        is_enabled=name in g.enabled_plugins,
-        is_installed=name in g.installed_plugins,
-        author_name=(
-            tutorclient.Client.get_plugin_author(index_entry) if index_entry else ""
-        ),
-        plugin_description=description,
-        plugin_config_unique=tutorclient.Client.plugin_config_unique(name),
-        plugin_config_defaults=tutorclient.Client.plugin_config_defaults(name),
-        user_config=tutorclient.Project.get_user_config(),
+        name,
+        store_snapshot.stamp,
+        config_generation,
+        plugins_generation,
     )
+    if (fragment := get_cached_fragment(cache_key)) is None:
+        fragment = await render_cached_template(
+            cache_key,
+            "plugin.html",
+            plugin_name=name,
+            is_enabled=name in tutorclient.Client.enabled_plugins(),
+            is_installed=is_installed,
+            author_name=(
+                tutorclient.Client.get_plugin_author(index_entry) if index_entry else ""
+            ),
+            plugin_description=(
+                store_snapshot.description_html(index_entry) if index_entry else ""
+            ),
+            plugin_config_unique=tutorclient.Client.plugin_config_unique(name),
+            plugin_config_defaults=tutorclient.Client.plugin_config_defaults(name),
+            user_config=tutorclient.Project.get_user_config(),
+        )
 
     # Redirect to plugin page
-    response = Response(rendered_template, status=200, content_type="text/html")
+    response = Response(fragment, status=200, content_type="text/html")
 
     response.headers["HX-Redirect"] = url_for("plugin", name=name)
     return response
 
 
-@app.get("/plugin/<name>/is-installed")
-def plugin_installed_status(name: str) -> Response:
-    return jsonify({"installed": name in g.installed_plugins})
-
-
 @app.post("/plugin/<name>/toggle")
 async def plugin_toggle(name: str) -> Response:
     # TODO check plugin exists
     form = await request.form
     enable_plugin = form.get("checked") == "on"
-    tutorclient.CliPool.run_sequential(
+    job = await tutorclient.CliPool.run_and_wait(
         ["plugins", "enable" if enable_plugin else "disable", name]
     )
-    # TODO error management
 
     response = t.cast(
         Response,
         await make_response(redirect(url_for("plugin", name=name))),
     )
     notify_run_sequential(response)
-    if enable_plugin:
-        update_plugins_requiring_launch(response, add=name)
-    else:
-        update_plugins_requiring_launch(response, remove=name)
+    # On failure, error details are available in the command logs
+    if job.status == tutorclient.Job.SUCCEEDED:
+        if enable_plugin:
+            update_plugins_requiring_launch(response, add=name)
+        else:
+            update_plugins_requiring_launch(response, remove=name)
     return response
 
 
 @app.post("/plugin/<name>/install")
 async def plugin_install(name: str) -> BaseResponse:
-    async def bg_install_and_reload() -> None:
-        tutorclient.CliPool.run_parallel(app, ["plugins", "install", name])
-        while tutorclient.CliPool.THREAD and tutorclient.CliPool.THREAD.is_alive():
-            await asyncio.sleep(0.1)
-        # TODO this is hackish. How can we improve?
-        discover_package(importlib_metadata.entry_points().__getitem__(name))
-
-    asyncio.create_task(bg_install_and_reload())
+    # The plugin is discovered once installed: clients are notified by a "plugins"
+    # event of the logs stream (see `tutorclient.discover_installed_plugins`).
+    tutorclient.CliPool.run_parallel(["plugins", "install", name])
     return redirect(
         url_for(
             "plugin",
@@ -331,7 +567,7 @@ async def plugin_install(name: str) -> BaseResponse:
 
 @app.post("/plugin/<name>/upgrade")
 async def plugin_upgrade(name: str) -> BaseResponse:
-    tutorclient.CliPool.run_parallel(app, ["plugins", "upgrade", name])
+    tutorclient.CliPool.run_parallel(["plugins", "upgrade", name])
     return redirect(
         url_for(
             "plugin",
@@ -342,32 +578,35 @@ async def plugin_upgrade(name: str) -> BaseResponse:
 
 @app.post("/plugins/update")
 async def plugins_update() -> BaseResponse:
-    tutorclient.CliPool.run_sequential(["plugins", "update"])
+    await tutorclient.CliPool.run_and_wait(["plugins", "update"])
     return redirect(url_for("plugin_store"))
 
 
 @app.post("/plugin/<name>/config/update")
 async def plugin_config_update(name: str) -> Response:
-    await process_config_update_request()
+    job = await process_config_update_request()
     response = t.cast(
         Response,
         await make_response(redirect(url_for("plugin", name=name))),
     )
-    update_plugins_requiring_launch(response, add=name)
+    if job.status == tutorclient.Job.SUCCEEDED:
+        update_plugins_requiring_launch(response, add=name)
     notify_run_sequential(response)
     return response
 
 
-async def process_config_update_request() -> None:
+async def process_config_update_request() -> tutorclient.Job:
     """
-    Set/Unset config key/values based on request form.
+    Set/Unset config key/values based on request form. Return the "config save" job,
+    once it has completed.
     """
 
     # Run save command
-    # TODO error management
     form = await request.form
     if unset := form.get("unset"):
-        tutorclient.CliPool.run_sequential(["config", "save", f"--unset={unset}"])
+        job = await tutorclient.CliPool.run_and_wait(
+            ["config", "save", f"--unset={unset}"]
+        )
     else:
         cmd = ["config", "save"]
         for key, value in form.items():
@@ -376,12 +615,14 @@ async def process_config_update_request() -> None:
                 # Otherwise there will be a parsing error because it might be considered a dictionary
                 value = f"'{value}'"
             cmd.extend(["--set", f"{key}={value}"])
-        tutorclient.CliPool.run_sequential(cmd)
+        job = await tutorclient.CliPool.run_and_wait(cmd)
 
     # Make sure that the configuration is reloaded where needed.
+    tutorclient.Project.clear_config_cache()
     # Note that this is not very robust. For instance, if the server is running multiple
     # workers, the configuration will only be reloaded for one of them.
     HttpAuthCredentials.load_credentials()
+    return job
 
 
 @app.get("/local/launch")
@@ -393,7 +634,7 @@ async def local_launch_view() -> str:
 
 @app.post("/cli/local/launch")
 async def cli_local_launch() -> str:
-    tutorclient.CliPool.run_parallel(app, ["local", "launch", "--non-interactive"])
+    tutorclient.CliPool.run_parallel(["local", "launch", "--non-interactive"])
     return await render_template(
         "local_launch.html",
     )
@@ -413,28 +654,350 @@ async def cli_logs_stream() -> ResponseTypes:
 
     Events are sent with the following format:
 
-        data: "json-encoded string..."
+        data: {"html": "json-encoded string...", "line": <line number>}
         event: logs
+        id: <command id>:<byte offset>
+
+    The line number is the number of the line on which the content starts, such that
+    clients can fetch earlier lines with `cli_job_lines`. Log content is converted to
+    HTML (see `ansi.AnsiToHtml`).
 
-    Data is JSON-encoded such that we can sent newline characters, etc.
+    Data is JSON-encoded such that we can sent newline characters, etc. Log content is
+    coalesced in frames of limited size and delay, to reduce the number of events.
+
+    Event IDs are used to resume the stream after a reconnection, either via the
+    standard "Last-Event-ID" header, or with the "?since=<event id>" argument. When
+    the stream cannot be resumed, only the last "?tail=<N>" KB of the logs are sent
+    (defaults to LOGS_STREAM_TAIL_KB). Use "?tail=0" to stream the full logs.
+
+    Changes of the running command and of its status are sent as separate events, only
+    when they change:
+
+        data: {"command": "tutor ...", "job": "<command id>"}
+        event: command
+
+        data: {"thread_alive": true, "status": "running"}
+        event: status
+
+    The progress of docker pulls and builds, which is removed from the logs, is sent as
+    a separate event, whenever it changes:
+
+        data: {"layers_done": 3, "layers_total": 8, "bytes_done": 1234, "bytes_total": 5678}
+        event: progress
+
+    Installed and enabled plugins are sent whenever they were modified by a command,
+    before the status of that command:
+
+        data: {"installed": ["mfe", ...], "enabled": ["mfe", ...]}
+        event: plugins
+
+    Logs of the most recently started command are streamed. When a command is started
+    while another one is still running, the stream switches to the new command, then
+    back to the previous one once the new command has completed.
     """
 
     # TODO check that request accepts event stream (see howto)
+    since = parse_log_event_id(
+        request.headers.get("Last-Event-ID") or request.args.get("since", "")
+    )
+    tail = request.args.get("tail", constants.LOGS_STREAM_TAIL_KB, type=int)
+    # When resuming, there might not be any new log: send the current state
+    job = tutorclient.CliPool.current_job() if since else None
+    # Note that this iterator never stops: it waits for new logs or new commands
+    chunks = tutorclient.CliPool.iter_logs(since=since, tail=tail * 1024)
+    return await make_log_event_stream(chunks, job)
+
+
+@app.get("/cli/jobs")
+async def cli_jobs() -> Response:
+    return jsonify([job.to_dict() for job in tutorclient.CliPool.list_jobs()])
+
+
+@app.get("/cli/jobs/<job_id>")
+async def cli_job(job_id: str) -> Response:
+    """
+    Return a job, either from memory or from the persistent history.
+    """
+    if job := tutorclient.CliPool.get_job(job_id):
+        return jsonify(job.to_dict())
+    if record := await asyncio.to_thread(history.History.get, job_id):
+        return jsonify(record)
+    return Response("Job not found", status=404)
+
+
+@app.get("/cli/history")
+async def cli_history() -> Response:
+    """
+    Page through past and current jobs, most recent first. The next page is fetched
+    with "?before=<next>", where "next" is returned with every page.
+    """
+    before = request.args.get("before", type=float)
+    limit = request.args.get("limit", constants.ITEMS_PER_PAGE, type=int)
+    limit = max(1, min(limit, constants.MAX_ITEMS_PER_PAGE))
+    records = await asyncio.to_thread(history.History.list, before, limit)
+    # In-memory jobs are more up-to-date than the history, which is written in the
+    # background
+    jobs = [
+        job.to_dict() if (job := tutorclient.CliPool.get_job(record["id"])) else record
+        for record in records
+    ]
+    return jsonify(
+        {
+            "jobs": jobs,
+            "next": records[-1]["created_at"] if len(records) == limit else None,
+        }
+    )
+
+
+@app.get("/cli/jobs/<job_id>/lines")
+async def cli_job_lines(job_id: str) -> Response:
+    """
+    Return a range of log lines of a job: "?start=<line number>&count=<N>". Negative
+    start values are counted from the end of the log. Lines are returned both as raw
+    text and as HTML. Lines are found with the log
+    index, such that the log is never read from the start.
+
+    As a consequence, HTML is rendered without the styles that were still active at
+    the start of the range: styles that span multiple lines are lost at the boundary.
+    """
+    start = request.args.get("start", 0, type=int)
+    count = request.args.get("count", constants.LOG_LINES_MAX_COUNT, type=int)
+    count = max(0, min(count, constants.LOG_LINES_MAX_COUNT))
+
+    def read_lines() -> tuple[int, int, list[tuple[int, bytes]]]:
+        total = logstore.LogStore.line_count(job_id)
+        first = max(0, total + start) if start < 0 else start
+        return total, first, logstore.LogStore.read_lines(job_id, first, count)
+
+    if not await job_exists(job_id):
+        return Response("Job not found", status=404)
+    total, first, lines = await asyncio.to_thread(read_lines)
+    converter = ansi.AnsiToHtml()
+    return jsonify(
+        {
+            "job": job_id,
+            "start": first,
+            "total": total,
+            "lines": [
+                {
+                    "offset": offset,
+                    "text": (text := content.decode(errors="replace")),
+                    "html": converter.feed(text + "\n")[:-1],
+                }
+                for offset, content in lines
+            ],
+        }
+    )
+
+
+@app.get("/cli/jobs/<job_id>/logs/search")
+async def cli_job_logs_search(job_id: str) -> ResponseTypes:
+    """
+    Search the logs of a job, and stream matching lines as newline-delimited JSON
+    objects (see `logsearch.LogMatch`), followed by a summary object:
+
+        {"line": 12, "offset": 345, "text": "...", "level": "error", "before": [...], "after": [...]}
+        ...
+        {"done": true, "matches": 1, "truncated": false}
+
+    Query arguments:
+
+        q: substring (or regular expression, with "regex=true") to search for. Search
+            is case-insensitive, unless "case=true".
+        level: only match "warning" or "error" lines, as guessed from their content.
+        context: number of context lines before and after each match.
+        start: line number from which to start searching.
+        max: maximum number of matches.
+
+    Logs are scanned in chunks, in a separate thread, such that large logs are never
+    loaded in memory. When the maximum number of matches is reached, the search can be
+    resumed from the line that follows the last match.
+    """
+    try:
+        pattern = logsearch.compile_pattern(
+            request.args.get("q", ""),
+            regex=request.args.get("regex", "") == "true",
+            case_sensitive=request.args.get("case", "") == "true",
+        )
+    except re.error as e:
+        return Response(f"Invalid regular expression: {e}", status=400)
+    level = request.args.get("level", "")
+    if level not in logsearch.LEVELS:
+        return Response(f"Invalid level: {level}", status=400)
+    context = request.args.get("context", 0, type=int)
+    context = max(0, min(context, constants.LOG_SEARCH_MAX_CONTEXT_LINES))
+    start = max(0, request.args.get("start", 0, type=int))
+    max_matches = request.args.get("max", constants.LOG_SEARCH_MAX_MATCHES, type=int)
+    max_matches = max(1, min(max_matches, constants.LOG_SEARCH_MAX_MATCHES))
+    if not await job_exists(job_id):
+        return Response("Job not found", status=404)
+
+    async def send_matches() -> t.AsyncIterator[bytes]:
+        # One more match is searched for, to detect truncated results
+        matches = itertools.islice(
+            logsearch.search(
+                logstore.LogStore.iter_lines(job_id, start),
+                first_line=start,
+                pattern=pattern,
+                min_level=level,
+                context=context,
+            ),
+            max_matches + 1,
+        )
+        count = 0
+        truncated = False
+        # Matches are fetched in batches, to limit the number of thread switches
+        while batch := await asyncio.to_thread(
+            list, itertools.islice(matches, constants.LOG_SEARCH_BATCH_SIZE)
+        ):
+            if count + len(batch) > max_matches:
+                batch = batch[: max_matches - count]
+                truncated = True
+            count += len(batch)
+            if batch:
+                yield "".join(
+                    json.dumps(match.to_dict()) + "\n" for match in batch
+                ).encode()
+        summary = {"done": True, "matches": count, "truncated": truncated}
+        yield (json.dumps(summary) + "\n").encode()
+
+    response = await make_response(
+        send_matches(),
+        {"Content-Type": "application/x-ndjson", "Cache-Control": "no-cache"},
+    )
+    setattr(response, "timeout", None)
+    return response
+
+
+async def job_exists(job_id: str) -> bool:
+    """
+    Return True if the job is in memory or in the history. Job IDs are used in log
+    paths, so only known jobs should be accepted.
+    """
+    if tutorclient.CliPool.get_job(job_id) is not None:
+        return True
+    return await asyncio.to_thread(history.History.get, job_id) is not None
+
+
+@app.get("/cli/jobs/<job_id>/logs/stream")
+async def cli_job_logs_stream(job_id: str) -> ResponseTypes:
+    """
+    Stream the logs of a single command, with the same events as `cli_logs_stream`.
+    The stream is closed once the command has completed.
+    """
+    job = tutorclient.CliPool.get_job(job_id)
+    if job is None:
+        return Response("Job not found", status=404)
+    since = parse_log_event_id(
+        request.headers.get("Last-Event-ID") or request.args.get("since", "")
+    )
+    offset = since[1] if since and since[0] == job.id else 0
+    return await make_log_event_stream(job.cli.iter_logs(offset=offset), job)
+
+
+@app.post("/cli/jobs/<job_id>/stop")
+async def cli_job_stop(job_id: str) -> Response:
+    if not tutorclient.CliPool.stop_job(job_id):
+        return Response("Job not found or already completed", status=404)
+    return Response(status=200)
+
+
+async def make_log_event_stream(
+    chunks: t.AsyncIterator[logs.LogChunk], job: t.Optional[tutorclient.Job] = None
+) -> ResponseTypes:
+    """
+    Stream log chunks as server-sent events. Command and status events are sent
+    whenever the job of a chunk changes or its status changes. When a job is given,
+    its state is sent first.
+
+    Progress events are sent whenever the progress of the current job changes, even
+    when there are no new logs, at most once per LOGS_FRAME_MAX_DELAY_SECONDS.
+
+    Plugins events are sent with the new chunks after the plugins were modified.
+    """
+
     async def send_events() -> t.AsyncIterator[bytes]:
-        while True:
-            # TODO this is again causing the stream to never stop...
-            async for data in tutorclient.CliPool.iter_logs():
-                event = f"""data: {
-                    json.dumps(
-                        {
-                            "stdout": data,
-                            "command": tutorclient.CliPool.current_command(),
-                            "thread_alive": tutorclient.CliPool.is_thread_alive(),
-                        }
+        command: t.Optional[dict[str, str]] = None
+        status: t.Optional[dict[str, t.Any]] = None
+        progress: dict[str, int] = {}
+        plugins_generation = tutorclient.Client.PLUGINS_GENERATION
+        current_job = job
+        # Conversion state of every job, because the stream may switch between jobs
+        converters: dict[str, ansi.AnsiToHtml] = {}
+        if current_job:
+            command = {"command": current_job.command, "job": current_job.id}
+            status = get_job_status(current_job)
+            yield sse_event("command", command)
+            yield sse_event("status", status)
+        batches = logs.iter_batches(
+            chunks,
+            max_bytes=constants.LOGS_FRAME_MAX_BYTES,
+            max_delay=constants.LOGS_FRAME_MAX_DELAY_SECONDS,
+        )
+        next_batch = asyncio.ensure_future(batches.__anext__())
+        try:
+            while True:
+                progress_changed = asyncio.ensure_future(
+                    wait_for_progress_change(current_job, progress)
+                )
+                try:
+                    await asyncio.wait(
+                        [next_batch, progress_changed],
+                        return_when=asyncio.FIRST_COMPLETED,
                     )
-                }\nevent: logs\n\n"""
-                yield event.encode()
-            await asyncio.sleep(constants.SHORT_SLEEP_SECONDS)
+                finally:
+                    progress_changed.cancel()
+                if (
+                    current_job
+                    and (job_progress := get_job_progress(current_job)) != progress
+                ):
+                    progress = job_progress
+                    yield sse_event("progress", progress)
+                if not next_batch.done():
+                    # Progress changed: don't send progress events too often
+                    await asyncio.sleep(constants.LOGS_FRAME_MAX_DELAY_SECONDS)
+                    continue
+                try:
+                    chunk = next_batch.result()
+                except StopAsyncIteration:
+                    break
+                next_batch = asyncio.ensure_future(batches.__anext__())
+
+                if current_job is None or current_job.id != chunk.source:
+                    current_job = tutorclient.CliPool.get_job(chunk.source)
+                if current_job:
+                    chunk_command = {
+                        "command": current_job.command,
+                        "job": current_job.id,
+                    }
+                    if chunk_command != command:
+                        command = chunk_command
+                        yield sse_event("command", command)
+                converter = converters.setdefault(chunk.source, ansi.AnsiToHtml())
+                if html := converter.feed(chunk.text):
+                    # Streams are resumed from the content that was not converted yet
+                    offset = chunk.offset - converter.pending_size
+                    yield sse_event(
+                        "logs",
+                        {"html": html, "line": chunk.line},
+                        event_id=f"{chunk.source}:{offset}",
+                    )
+                # Plugins are modified before the command completes
+                if tutorclient.Client.PLUGINS_GENERATION != plugins_generation:
+                    plugins_generation = tutorclient.Client.PLUGINS_GENERATION
+                    yield sse_event("plugins", get_plugins_state())
+                if current_job:
+                    chunk_status = get_job_status(current_job)
+                    if chunk_status != status:
+                        status = chunk_status
+                        yield sse_event("status", status)
+        finally:
+            if not next_batch.done():
+                # The batch iterator cannot be closed while it is running
+                next_batch.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await next_batch
+            await batches.aclose()
 
     response = await make_response(
         send_events(),
@@ -448,12 +1011,85 @@ async def cli_logs_stream() -> ResponseTypes:
     return response
 
 
+def get_job_status(job: tutorclient.Job) -> dict[str, t.Any]:
+    return {"thread_alive": job.cli.is_running, "status": job.status}
+
+
+def get_plugins_state() -> dict[str, list[str]]:
+    return {
+        "installed": tutorclient.Client.installed_plugins(),
+        "enabled": tutorclient.Client.enabled_plugins(),
+    }
+
+
+def get_job_progress(job: tutorclient.Job) -> dict[str, int]:
+    """
+    Return the progress of docker pulls and builds, or an empty dict if there is none.
+    """
+    return job.cli.progress.to_dict() if job.cli.progress.layers else {}
+
+
+async def wait_for_progress_change(
+    job: t.Optional[tutorclient.Job], progress: dict[str, int]
+) -> None:
+    if job is None:
+        # Wait forever
+        await asyncio.Future()
+        return
+    await job.cli.progress.notifier.wait_for(lambda: get_job_progress(job) != progress)
+
+
+def sse_event(name: str, data: t.Any, event_id: str = "") -> bytes:
+    """
+    Format a server-sent event with JSON-encoded data.
+    """
+    event = f"data: {json.dumps(data)}\nevent: {name}\n"
+    if event_id:
+        event += f"id: {event_id}\n"
+    return f"{event}\n".encode()
+
+
+def parse_log_event_id(event_id: str) -> t.Optional[tuple[str, int]]:
+    """
+    Parse "<command id>:<byte offset>" log event IDs. Invalid IDs are ignored.
+    """
+    source, _sep, offset = event_id.rpartition(":")
+    if not source or not offset.isdigit():
+        return None
+    return source, int(offset)
+
+
 @app.post("/cli/stop")
 async def cli_stop() -> Response:
-    tutorclient.CliPool.stop()
+    """
+    Stop the command whose logs are currently streamed.
+    """
+    if job := tutorclient.CliPool.current_job():
+        tutorclient.CliPool.stop_job(job.id)
     return Response(status=200)
 
 
+@app.before_serving
+async def start_workers() -> None:
+    """
+    Start a worker in advance, such that the first command starts without delay. In a
+    multi-worker server, start synchronizing with the other server processes.
+    """
+    if tutorclient.CliPool.USE_WORKERS:
+        await asyncio.to_thread(worker.WorkerPool.recycle)
+    await asyncio.to_thread(coordination.Coordinator.start)
+
+
+@app.after_serving
+async def stop_jobs() -> None:
+    """
+    Stop all commands whenever the Quart app is requested to stop/exit/shutdown. This
+    happens for instance on dev reload.
+    """
+    await asyncio.to_thread(tutorclient.CliPool.stop)
+    await asyncio.to_thread(coordination.Coordinator.stop)
+
+
 @app.get("/advanced")
 async def advanced() -> str:
     return await render_template(
@@ -461,11 +1097,30 @@ async def advanced() -> str:
     )
 
 
+# Keep track of the latest suggestion request of every client
+SUGGESTION_REQUESTS = completion.RequestSequencer()
+
+
 @app.post("/suggest")
 async def suggest() -> Response:
+    """
+    Suggest completions for a partial command.
+
+    Clients may send a client ID and an incrementing sequence number with every
+    request: outdated requests, for which a newer request was already received, are
+    dropped with an empty 204 response.
+    """
     data = await request.get_json()
     partial_command = data.get("command", "")
-    suggestions = tutorclient.Client.autocomplete(partial_command)
+    client_id = data.get("client")
+    sequence = data.get("seq")
+    if isinstance(client_id, str) and isinstance(sequence, int):
+        if not SUGGESTION_REQUESTS.register(client_id, sequence):
+            return Response(status=204)
+    # Parameter completions might load the configuration, which is slow
+    suggestions = await asyncio.to_thread(
+        tutorclient.Client.autocomplete, partial_command
+    )
     return jsonify(suggestions)
 
 
@@ -474,7 +1129,7 @@ async def command() -> BaseResponse:
     form = await request.form
     command_string = form.get("command", "")
     command_args = command_string.split()
-    tutorclient.CliPool.run_parallel(app, command_args)
+    tutorclient.CliPool.run_parallel(command_args)
     return redirect(url_for("advanced"))
 
 
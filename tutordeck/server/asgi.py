@@ -0,0 +1,25 @@
+# Entrypoint of the processes of a multi-worker server, for ASGI servers. E.g:
+#
+#   TUTOR_ROOT=/path/to/root hypercorn --workers 4 tutordeck.server.asgi:app
+#
+# Tutor commands are run in worker processes when TUTOR_DECK_ISOLATED is not empty.
+import os
+
+import tutor.commands.cli
+from tutor import hooks
+
+from . import app as deck
+from . import constants
+
+# Discover plugins, then resolve the project root and load its plugins, exactly like
+# the tutor command line does.
+hooks.Actions.CORE_READY.do()
+context = tutor.commands.cli.cli.make_context("tutor", [])
+tutor.commands.cli.cli.ensure_plugins_enabled(context)
+
+deck.setup(
+    context.params["root"],
+    isolated=bool(os.environ.get(constants.ISOLATED_ENV_VAR)),
+    shared=True,
+)
+app = deck.app
@@ -0,0 +1,153 @@
+import gzip
+import hashlib
+import json
+import os
+import typing as t
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIRECTORY = os.path.join(os.path.dirname(__file__), "static")
+# Fingerprinted file names, indexed by the path of the source files in the static
+# directory, e.g: {"js/deck.js": "js/deck.0123456789ab.js"}
+MANIFEST_FILENAME = "manifest.json"
+FINGERPRINT_LENGTH = 12
+# Extensions of precompressed variants, by content encoding, in order of preference
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+COMPRESSIBLE_EXTENSIONS = (".css", ".js", ".map", ".svg")
+# Sources of compiled assets, which are not served
+IGNORED_DIRECTORIES = ("scss",)
+
+
+class StaticAssets:
+    """
+    Static assets, as prepared by `build` when the package is built.
+
+    Assets are referenced by fingerprinted URLs, which change whenever the content of
+    a file changes, such that browsers can cache them forever. Fingerprinted names are
+    mapped back to the source files, which are not copied.
+
+    When no manifest was built, as in development, the original file names are used.
+    """
+
+    DIRECTORY = STATIC_DIRECTORY
+    # Fingerprinted file names, indexed by source file, and the other way around
+    FINGERPRINTS: t.Optional[dict[str, str]] = None
+    SOURCES: dict[str, str] = {}
+    DIGEST: str = ""
+
+    @classmethod
+    def fingerprint(cls, filename: str) -> str:
+        """
+        Return the fingerprinted name of a static file, or the original name if it has
+        none.
+        """
+        return cls.load().get(filename, filename)
+
+    @classmethod
+    def resolve(cls, filename: str) -> tuple[str, bool]:
+        """
+        Return the source of a requested static file, and whether it was requested
+        with a fingerprinted name.
+        """
+        cls.load()
+        if source := cls.SOURCES.get(filename):
+            return source, True
+        return filename, False
+
+    @classmethod
+    def digest(cls) -> str:
+        """
+        Return a short hash of the manifest, which changes whenever a file changes.
+        """
+        cls.load()
+        return cls.DIGEST
+
+    @classmethod
+    def load(cls) -> dict[str, str]:
+        """
+        Load the manifest on first access.
+        """
+        if cls.FINGERPRINTS is None:
+            try:
+                with open(os.path.join(cls.DIRECTORY, MANIFEST_FILENAME), "rb") as f:
+                    manifest = f.read()
+            except FileNotFoundError:
+                manifest = b"{}"
+            fingerprints: dict[str, str] = json.loads(manifest)
+            cls.SOURCES = {value: key for key, value in fingerprints.items()}
+            cls.DIGEST = hashlib.sha256(manifest).hexdigest()[:FINGERPRINT_LENGTH]
+            cls.FINGERPRINTS = fingerprints
+        return cls.FINGERPRINTS
+
+
+def negotiate_encoding(path: str, accepted: t.Container[str]) -> str:
+    """
+    Return the preferred content encoding of the precompressed variants of a file that
+    are accepted by the client, or an empty string if there is none.
+
+    Variants that are older than the file are stale, for instance when the file was
+    edited after the last build: they are ignored.
+    """
+    for encoding, extension in ENCODINGS.items():
+        if encoding not in accepted:
+            continue
+        try:
+            if os.path.getmtime(path + extension) >= os.path.getmtime(path):
+                return encoding
+        except OSError:
+            continue
+    return ""
+
+
+def build(directory: str = STATIC_DIRECTORY) -> dict[str, str]:
+    """
+    Fingerprint all static files, write their precompressed variants, and save the
+    manifest. This must run after the SCSS files were compiled. Brotli variants are
+    only written if the "brotli" package is installed.
+    """
+    fingerprints: dict[str, str] = {}
+    for path in iter_static_files(directory):
+        with open(path, "rb") as f:
+            content = f.read()
+        filename = os.path.relpath(path, directory).replace(os.sep, "/")
+        digest = hashlib.sha256(content).hexdigest()[:FINGERPRINT_LENGTH]
+        stem, extension = os.path.splitext(filename)
+        fingerprints[filename] = f"{stem}.{digest}{extension}"
+        if extension in COMPRESSIBLE_EXTENSIONS:
+            # Timestamps are omitted, such that builds are reproducible
+            write_variant(path + ENCODINGS["gzip"], gzip.compress(content, mtime=0))
+            if brotli is not None:
+                write_variant(path + ENCODINGS["br"], brotli.compress(content))
+    with open(os.path.join(directory, MANIFEST_FILENAME), "w", encoding="utf-8") as f:
+        json.dump(fingerprints, f, indent=2, sort_keys=True)
+    return fingerprints
+
+
+def iter_static_files(directory: str) -> t.Iterator[str]:
+    """
+    Iterate on the paths of the files that are served, without their compressed
+    variants.
+    """
+    for parent, dirnames, filenames in os.walk(directory):
+        if parent == directory:
+            dirnames[:] = [name for name in dirnames if name not in IGNORED_DIRECTORIES]
+        for filename in sorted(filenames):
+            if (
+                filename.startswith(".")
+                or filename == MANIFEST_FILENAME
+                or filename.endswith(tuple(ENCODINGS.values()))
+            ):
+                continue
+            yield os.path.join(parent, filename)
+
+
+def write_variant(path: str, content: bytes) -> None:
+    with open(path, "wb") as f:
+        f.write(content)
+
+
+if __name__ == "__main__":
+    build()
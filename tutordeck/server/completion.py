@@ -0,0 +1,236 @@
+import collections
+import functools
+import threading
+import typing as t
+
+import click
+
+
+class PrefixTrie:
+    """
+    Character trie that maps words to arbitrary values.
+    """
+
+    # Key of the value stored in terminal nodes. This key cannot conflict with
+    # characters, because it's an empty string.
+    VALUE_KEY = ""
+
+    def __init__(self) -> None:
+        self.root: dict[str, t.Any] = {}
+
+    def insert(self, word: str, value: t.Any) -> None:
+        node = self.root
+        for char in word:
+            node = node.setdefault(char, {})
+        node[self.VALUE_KEY] = value
+
+    def complete(self, prefix: str) -> list[t.Any]:
+        """
+        Return the values of all words that start with the prefix, sorted by word.
+        """
+        node = self.root
+        for char in prefix:
+            if char not in node:
+                return []
+            node = node[char]
+        values = []
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if self.VALUE_KEY in node:
+                values.append(node[self.VALUE_KEY])
+            # Push children in reverse order, such that they are popped in order
+            stack.extend(
+                node[char] for char in sorted(node, reverse=True) if char != ""
+            )
+        return values
+
+
+class CommandNode:
+    """
+    Completion data of a single click command: subcommands, options and arguments.
+    """
+
+    def __init__(self, command: click.Command, ctx: click.Context) -> None:
+        self.command = command
+        # Context of the command, whose parents are the contexts of the parent commands
+        self.ctx = ctx
+        self.subcommands: dict[str, CommandNode] = {}
+        self.subcommands_trie = PrefixTrie()
+        self.options: dict[str, click.Option] = {}
+        self.options_trie = PrefixTrie()
+        self.arguments: list[click.Argument] = []
+
+        for param in command.get_params(ctx):
+            if isinstance(param, click.Option):
+                if param.hidden:
+                    continue
+                for name in param.opts + param.secondary_opts:
+                    self.options[name] = param
+                    self.options_trie.insert(name, (name, param.help or ""))
+            elif isinstance(param, click.Argument):
+                self.arguments.append(param)
+
+        if isinstance(command, click.Group):
+            for name in command.list_commands(ctx):
+                subcommand = command.get_command(ctx, name)
+                if subcommand is None or subcommand.hidden:
+                    continue
+                sub_ctx = click.Context(subcommand, info_name=name, parent=ctx)
+                self.subcommands[name] = CommandNode(subcommand, sub_ctx)
+                self.subcommands_trie.insert(
+                    name, (name, subcommand.get_short_help_str())
+                )
+
+
+class CompletionEngine:
+    """
+    Complete partial Tutor commands.
+
+    The tree of click commands and options is walked just once, on creation. Thus, a new
+    engine must be created whenever CLI commands are added or removed, e.g: when plugins
+    are enabled or disabled. The contexts of all commands derive from the context of
+    the root command, such that parameter completions have access to its parameters and
+    its context object.
+
+    Static completions (subcommands, options and choices) of recent partial commands
+    are cached. Custom parameter types may have dynamic completions (e.g:
+    configuration keys), which are never cached.
+    """
+
+    def __init__(
+        self,
+        cli: click.Command,
+        ctx: t.Optional[click.Context] = None,
+        cache_size: int = 256,
+    ) -> None:
+        self.root = CommandNode(cli, ctx or click.Context(cli, info_name=cli.name))
+        self._complete_static = functools.lru_cache(maxsize=cache_size)(self._walk)
+
+    def complete(self, partial_command: str) -> list[dict[str, str]]:
+        """
+        Return completions of the last word of the partial command.
+        """
+        completions, dynamic_param = self._complete_static(partial_command)
+        if dynamic_param is not None:
+            node, param, incomplete = dynamic_param
+            completions += tuple(self._complete_dynamic(node, param, incomplete))
+        return [
+            {"text": text, "display": text, "help": help_text}
+            for text, help_text in completions
+        ]
+
+    def _walk(self, partial_command: str) -> tuple[
+        tuple[tuple[str, str], ...],
+        t.Optional[tuple[CommandNode, click.Parameter, str]],
+    ]:
+        """
+        Return the static completions of the last word of the partial command, and the
+        parameter whose dynamic completions must be computed, if any.
+        """
+        words = partial_command.split()
+        if not partial_command or partial_command[-1].isspace():
+            # Start completing a new word
+            words.append("")
+        incomplete = words.pop()
+        node, option, argument_index, _path = self._parse(words)
+
+        completions: list[tuple[str, str]] = []
+        param: t.Optional[click.Parameter] = None
+        if option is not None:
+            param = option
+        elif incomplete.startswith("-"):
+            completions = node.options_trie.complete(incomplete)
+        else:
+            completions = node.subcommands_trie.complete(incomplete)
+            if argument_index < len(node.arguments):
+                param = node.arguments[argument_index]
+
+        if param is None:
+            return tuple(completions), None
+        if isinstance(param.type, click.Choice):
+            completions += [
+                (str(choice), "")
+                for choice in param.type.choices
+                if str(choice).startswith(incomplete)
+            ]
+            return tuple(completions), None
+        if isinstance(param.type, click.Path) or (
+            type(param.type).shell_complete is click.ParamType.shell_complete
+        ):
+            return tuple(completions), None
+        return tuple(completions), (node, param, incomplete)
+
+    def command_path(self, args: t.Sequence[str]) -> list[str]:
+        """
+        Return the names of the (sub)commands of a command, along with their
+        arguments, without options and option values.
+        """
+        return self._parse(args)[3]
+
+    def _parse(
+        self, words: t.Sequence[str]
+    ) -> tuple[CommandNode, t.Optional[click.Option], int, list[str]]:
+        """
+        Walk the command tree. Return the last command, the option whose value is
+        expected next, if any, the index of the next argument of the last command, and
+        the names of the (sub)commands and arguments.
+        """
+        node = self.root
+        option: t.Optional[click.Option] = None
+        argument_index = 0
+        path: list[str] = []
+        for word in words:
+            if option is not None:
+                # This word is the option value
+                option = None
+            elif word.startswith("-"):
+                option = node.options.get(word)
+                if option is not None and (option.is_flag or option.count):
+                    option = None
+            else:
+                path.append(word)
+                if word in node.subcommands:
+                    node = node.subcommands[word]
+                    argument_index = 0
+                else:
+                    argument_index += 1
+        return node, option, argument_index, path
+
+    @staticmethod
+    def _complete_dynamic(
+        node: CommandNode, param: click.Parameter, incomplete: str
+    ) -> list[tuple[str, str]]:
+        """
+        Complete the values of parameters with custom types.
+        """
+        return [
+            (str(item.value), item.help or "")
+            for item in param.type.shell_complete(node.ctx, param, incomplete)
+        ]
+
+
+class RequestSequencer:
+    """
+    Detect outdated requests from the same client.
+
+    Clients number their requests. A request is outdated when a request with a higher
+    number was already received from the same client. Only the most recent clients are
+    remembered.
+    """
+
+    def __init__(self, max_clients: int = 1024) -> None:
+        self.max_clients = max_clients
+        self._latest: collections.OrderedDict[str, int] = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def register(self, client_id: str, sequence: int) -> bool:
+        """
+        Register a new request, and return False if it is already outdated.
+        """
+        with self._lock:
+            latest = max(self._latest.pop(client_id, sequence), sequence)
+            self._latest[client_id] = latest
+            while len(self._latest) > self.max_clients:
+                self._latest.popitem(last=False)
+            return sequence >= latest
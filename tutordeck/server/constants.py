@@ -2,3 +2,38 @@ SHORT_SLEEP_SECONDS = 0.1
 PLUGINS_REQUIRE_LAUNCH_COOKIE_NAME = "plugins-require-launch"
 COMMAND_EXECUTED_COOKIE_NAME = "command-executed"
 ITEMS_PER_PAGE = 100
+LOG_BUFFER_MAX_BYTES = 1024 * 1024
+LOG_READ_CHUNK_BYTES = 64 * 1024
+LOGS_FRAME_MAX_BYTES = 64 * 1024
+LOGS_FRAME_MAX_DELAY_SECONDS = 0.25
+LOGS_STREAM_TAIL_KB = 64
+MAX_ITEMS_PER_PAGE = 500
+JOBS_HISTORY_SIZE = 100
+MAX_RUNNING_JOBS = 4
+SEQUENTIAL_COMMAND_TIMEOUT_SECONDS = 300
+WORKER_EXIT_TIMEOUT_SECONDS = 5
+PROCESS_TERMINATE_TIMEOUT_SECONDS = 5
+LOG_SEGMENT_MAX_BYTES = 8 * 1024 * 1024
+LOG_MAX_SEGMENTS_PER_JOB = 16
+LOG_WRITE_BUFFER_BYTES = 64 * 1024
+# One of "zstd" (requires the zstandard package, falls back to gzip), "gzip", "none"
+LOG_COMPRESSION = "zstd"
+LOG_RETENTION_COUNT = 100
+LOG_RETENTION_SECONDS = 7 * 24 * 3600
+LOG_INDEX_INTERVAL_LINES = 1000
+LOG_LINES_MAX_COUNT = 1000
+HISTORY_RETENTION_COUNT = 1000
+# Persistent data of the deck (command history and logs), relative to the project root
+DATA_DIRNAME = "deck"
+LOG_SEARCH_MAX_MATCHES = 1000
+LOG_SEARCH_MAX_CONTEXT_LINES = 10
+LOG_SEARCH_BATCH_SIZE = 100
+PROGRESS_REWRITE_INTERVAL_SECONDS = 1
+# Delay between two synchronizations of the workers of a multi-worker server
+COORDINATION_POLL_INTERVAL_SECONDS = 0.5
+# Run Tutor commands in worker processes, in the processes of a multi-worker server
+ISOLATED_ENV_VAR = "TUTOR_DECK_ISOLATED"
+# Browser cache lifetime of fingerprinted static files
+STATIC_MAX_AGE_SECONDS = 365 * 24 * 3600
+# Memory cap of the cache of rendered HTML fragments, per server process
+FRAGMENT_CACHE_MAX_BYTES = 16 * 1024 * 1024
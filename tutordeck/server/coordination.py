@@ -0,0 +1,172 @@
+import logging
+import os
+import threading
+import typing as t
+
+from . import constants, history, locks
+
+logger = logging.getLogger(__name__)
+
+
+class Coordinator:
+    """
+    Share state between the processes of a multi-worker server.
+
+    Every worker runs the jobs that were submitted to it, and records them in the
+    history database, which is shared by all workers. A background thread polls the
+    database every COORDINATION_POLL_INTERVAL_SECONDS, and calls the pollers, which
+    mirror the jobs of other workers (see `CliPool.sync_remote_jobs`).
+
+    Workers cache state that is expensive to compute, such as the list of loaded
+    plugins. Whenever a worker modifies such state, it increments the corresponding
+    generation counter in the database, and the subscribers of that counter are called
+    in all other workers.
+
+    This is a no-op until `enable` is called, such that single-process servers do not
+    pay for coordination.
+    """
+
+    ENABLED: bool = False
+    # Generation counters, as last seen by this process
+    GENERATIONS: dict[str, int] = {}
+    SUBSCRIBERS: dict[str, list[t.Callable[[], None]]] = {}
+    # Functions that are called on every poll. Their argument is True if the database
+    # was modified by another process since the previous poll.
+    POLLERS: list[t.Callable[[bool], None]] = []
+    DATA_VERSION: int = 0
+    THREAD: t.Optional[threading.Thread] = None
+    STOP = threading.Event()
+    LOCK = threading.Lock()
+
+    @classmethod
+    def enable(cls, locks_directory: str) -> None:
+        cls.ENABLED = True
+        ResourceLocks.DIRECTORY = locks_directory
+        os.makedirs(locks_directory, exist_ok=True)
+
+    @classmethod
+    def add_poller(cls, poller: t.Callable[[bool], None]) -> None:
+        cls.POLLERS.append(poller)
+
+    @classmethod
+    def subscribe(cls, name: str, callback: t.Callable[[], None]) -> None:
+        """
+        Call a function whenever another process increments a generation counter.
+        """
+        cls.SUBSCRIBERS.setdefault(name, []).append(callback)
+
+    @classmethod
+    def bump(cls, name: str) -> None:
+        """
+        Increment a generation counter, such that the subscribers of other processes
+        are called. The current process is responsible for updating its own state.
+        """
+        if not cls.ENABLED:
+            return
+        value = history.History.bump_generation(name)
+        with cls.LOCK:
+            previous = cls.GENERATIONS.get(name, 0)
+            cls.GENERATIONS[name] = value
+        if value != previous + 1:
+            # Another process incremented the counter since the last poll
+            cls._notify(name)
+
+    @classmethod
+    def start(cls) -> None:
+        if not cls.ENABLED or cls.THREAD is not None:
+            return
+        cls.GENERATIONS = history.History.generations()
+        cls.DATA_VERSION = history.History.data_version()
+        cls.STOP.clear()
+        cls.THREAD = threading.Thread(
+            target=cls._run, name="tutor-deck-coordinator", daemon=True
+        )
+        cls.THREAD.start()
+
+    @classmethod
+    def stop(cls) -> None:
+        if cls.THREAD is None:
+            return
+        cls.STOP.set()
+        cls.THREAD.join()
+        cls.THREAD = None
+
+    @classmethod
+    def _run(cls) -> None:
+        while not cls.STOP.wait(constants.COORDINATION_POLL_INTERVAL_SECONDS):
+            try:
+                cls.poll()
+            except Exception:  # pylint: disable=broad-exception-caught
+                # Coordination must survive transient errors, such as a locked database
+                logger.exception("Failed to synchronize with other server workers")
+
+    @classmethod
+    def poll(cls) -> None:
+        data_version = history.History.data_version()
+        changed = data_version != cls.DATA_VERSION
+        cls.DATA_VERSION = data_version
+        for poller in cls.POLLERS:
+            poller(changed)
+        if not changed:
+            return
+        for name, value in history.History.generations().items():
+            with cls.LOCK:
+                previous = cls.GENERATIONS.get(name)
+                cls.GENERATIONS[name] = value
+            if value != previous:
+                cls._notify(name)
+
+    @classmethod
+    def _notify(cls, name: str) -> None:
+        for callback in cls.SUBSCRIBERS.get(name, []):
+            callback()
+
+
+class ResourceLocks:
+    """
+    File locks on the resources that are used by a job (see the locks module), such
+    that conflicting jobs are never run at the same time by different processes.
+
+    Every lock is acquired with a shared or exclusive lock on a file named after the
+    resource. Jobs that lock all resources hold an exclusive lock on a common file,
+    of which all other jobs hold a shared lock. Locks are acquired all at once, or not
+    at all, such that processes never wait for each other while holding locks.
+
+    Locks are always acquired when coordination is disabled. File locks are only
+    available on POSIX platforms, where coordination can be enabled.
+    """
+
+    DIRECTORY: str = ""
+
+    def __init__(self, job_locks: locks.Locks) -> None:
+        self.locks = dict(job_locks)
+        self.locks.setdefault(locks.ALL, locks.SHARED)
+        self._files: list[t.BinaryIO] = []
+
+    def acquire(self) -> bool:
+        """
+        Try to acquire all locks, without blocking. Return True on success.
+        """
+        if not self.DIRECTORY or self._files:
+            return True
+        # Coordination is only enabled with multiple workers, on POSIX platforms
+        import fcntl  # pylint: disable=import-outside-toplevel
+
+        for resource, mode in sorted(self.locks.items()):
+            filename = "all" if resource == locks.ALL else resource
+            # pylint: disable=consider-using-with
+            f = open(os.path.join(self.DIRECTORY, f"{filename}.lock"), "ab")
+            self._files.append(f)
+            operation = fcntl.LOCK_EX if mode == locks.EXCLUSIVE else fcntl.LOCK_SH
+            try:
+                fcntl.flock(f.fileno(), operation | fcntl.LOCK_NB)
+            except BlockingIOError:
+                self.release()
+                return False
+        return True
+
+    def release(self) -> None:
+        # Locks are released when their file is closed
+        files, self._files = self._files, []
+        for f in files:
+            f.close()
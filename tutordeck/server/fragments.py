@@ -0,0 +1,64 @@
+import collections
+import threading
+import typing as t
+
+from . import constants
+
+
+class FragmentCache:
+    """
+    Process-wide LRU cache of rendered HTML fragments.
+
+    Cache keys must include the generations of all the state that a fragment is
+    rendered from (plugin store, configuration, enabled plugins...), such that stale
+    fragments are never returned. Instead, they are evicted once the total size of the
+    cached fragments exceeds FRAGMENT_CACHE_MAX_BYTES.
+    """
+
+    ENTRIES: collections.OrderedDict[t.Hashable, bytes] = collections.OrderedDict()
+    SIZE: int = 0
+    HITS: int = 0
+    MISSES: int = 0
+    LOCK = threading.Lock()
+
+    @classmethod
+    def get(cls, key: t.Hashable) -> t.Optional[bytes]:
+        with cls.LOCK:
+            fragment = cls.ENTRIES.get(key)
+            if fragment is None:
+                cls.MISSES += 1
+                return None
+            cls.HITS += 1
+            cls.ENTRIES.move_to_end(key)
+            return fragment
+
+    @classmethod
+    def set(cls, key: t.Hashable, fragment: bytes) -> None:
+        if len(fragment) > constants.FRAGMENT_CACHE_MAX_BYTES:
+            return
+        with cls.LOCK:
+            if (previous := cls.ENTRIES.pop(key, None)) is not None:
+                cls.SIZE -= len(previous)
+            cls.ENTRIES[key] = fragment
+            cls.SIZE += len(fragment)
+            while cls.SIZE > constants.FRAGMENT_CACHE_MAX_BYTES:
+                _key, evicted = cls.ENTRIES.popitem(last=False)
+                cls.SIZE -= len(evicted)
+
+    @classmethod
+    def clear(cls) -> None:
+        with cls.LOCK:
+            cls.ENTRIES.clear()
+            cls.SIZE = 0
+
+    @classmethod
+    def info(cls) -> dict[str, int]:
+        """
+        Cache statistics, for monitoring purposes.
+        """
+        return {
+            "hits": cls.HITS,
+            "misses": cls.MISSES,
+            "size": len(cls.ENTRIES),
+            "bytes": cls.SIZE,
+        }
@@ -0,0 +1,292 @@
+import concurrent.futures
+import json
+import os
+import sqlite3
+import threading
+import typing as t
+
+from . import constants
+
+# Status of jobs that were still queued or running when the server stopped
+INTERRUPTED = "interrupted"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    command TEXT NOT NULL,
+    status TEXT NOT NULL,
+    exit_code INTEGER,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    ended_at REAL,
+    log_path TEXT NOT NULL,
+    processes TEXT NOT NULL DEFAULT '[]',
+    owner INTEGER,
+    stop_requested INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS jobs_created_at ON jobs (created_at);
+CREATE TABLE IF NOT EXISTS generations (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+COLUMNS = (
+    "id",
+    "command",
+    "status",
+    "exit_code",
+    "created_at",
+    "started_at",
+    "ended_at",
+    "log_path",
+    "processes",
+    "owner",
+)
+
+
+class History:
+    """
+    Persistent record of all Tutor commands, stored in a SQLite database in the project
+    root, such that past runs and their logs can be browsed after they were evicted from
+    memory or after the server was restarted.
+
+    Writes are performed in a background thread, in submission order, such that they
+    never block the event loop or the execution of commands. History is not recorded
+    until `connect` is called.
+
+    The database is also the state that is shared by the processes of a multi-worker
+    server (see the coordination module): every job record is owned by the process
+    that runs the job, and stop requests and generation counters are written there by
+    any worker.
+    """
+
+    CONNECTION: t.Optional[sqlite3.Connection] = None
+    LOCK = threading.Lock()
+    WRITER = concurrent.futures.ThreadPoolExecutor(
+        max_workers=1, thread_name_prefix="tutor-deck-history"
+    )
+
+    @classmethod
+    def connect(cls, path: str) -> None:
+        """
+        Open (and create, if necessary) the history database. Jobs that were not
+        completed by a server process that no longer exists are marked as interrupted.
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        connection = sqlite3.connect(path, check_same_thread=False)
+        connection.row_factory = sqlite3.Row
+        with cls.LOCK, connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+            owners = connection.execute(
+                "SELECT DISTINCT owner FROM jobs WHERE ended_at IS NULL AND status != ?",
+                (INTERRUPTED,),
+            ).fetchall()
+            for (owner,) in owners:
+                if owner is None or not is_alive(owner):
+                    interrupt(connection, owner)
+            cls.CONNECTION = connection
+
+    @classmethod
+    def save_later(cls, job: dict[str, t.Any]) -> None:
+        """
+        Insert or update a job record, as returned by `Job.to_dict`, in the background.
+        """
+        if cls.CONNECTION is not None:
+            cls.WRITER.submit(cls.save, job)
+
+    @classmethod
+    def save(cls, job: dict[str, t.Any]) -> None:
+        record = {column: job.get(column) for column in COLUMNS}
+        record["processes"] = json.dumps(job.get("processes", []))
+        with cls.LOCK:
+            if (connection := cls.CONNECTION) is None:
+                return
+            with connection:  # pylint: disable=not-context-manager
+                # Stop requests are written by other workers, so we must not replace
+                # the existing record
+                connection.execute(
+                    f"INSERT INTO jobs ({', '.join(COLUMNS)})"
+                    f" VALUES ({', '.join(':' + column for column in COLUMNS)})"
+                    " ON CONFLICT (id) DO UPDATE SET "
+                    + ", ".join(f"{column} = excluded.{column}" for column in COLUMNS),
+                    record,
+                )
+                if job.get("ended_at") is not None:
+                    prune(connection)
+
+    @classmethod
+    def get(cls, job_id: str) -> t.Optional[dict[str, t.Any]]:
+        with cls.LOCK:
+            if cls.CONNECTION is None:
+                return None
+            row = cls.CONNECTION.execute(
+                "SELECT * FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return to_dict(row) if row else None
+
+    @classmethod
+    def list_unfinished(cls) -> list[dict[str, t.Any]]:
+        """
+        Return the jobs that are queued or running, in all server processes.
+        """
+        with cls.LOCK:
+            if cls.CONNECTION is None:
+                return []
+            rows = cls.CONNECTION.execute(
+                "SELECT * FROM jobs WHERE ended_at IS NULL AND status != ?"
+                " ORDER BY created_at",
+                (INTERRUPTED,),
+            ).fetchall()
+        return [to_dict(row) for row in rows]
+
+    @classmethod
+    def request_stop(cls, job_id: str) -> None:
+        """
+        Ask the process that owns a job to stop it, in the background.
+        """
+        if cls.CONNECTION is not None:
+            cls.WRITER.submit(cls._request_stop, job_id)
+
+    @classmethod
+    def _request_stop(cls, job_id: str) -> None:
+        with cls.LOCK:
+            if (connection := cls.CONNECTION) is None:
+                return
+            with connection:  # pylint: disable=not-context-manager
+                connection.execute(
+                    "UPDATE jobs SET stop_requested = 1"
+                    " WHERE id = ? AND ended_at IS NULL",
+                    (job_id,),
+                )
+
+    @classmethod
+    def pop_stop_requests(cls, owner: int) -> list[str]:
+        """
+        Return the IDs of the jobs of a process that other processes requested to stop.
+        Requests are only returned once.
+        """
+        with cls.LOCK:
+            if (connection := cls.CONNECTION) is None:
+                return []
+            with connection:  # pylint: disable=not-context-manager
+                rows = connection.execute(
+                    "SELECT id FROM jobs WHERE owner = ? AND stop_requested != 0",
+                    (owner,),
+                ).fetchall()
+                connection.executemany(
+                    "UPDATE jobs SET stop_requested = 0 WHERE id = ?", rows
+                )
+        return [row["id"] for row in rows]
+
+    @classmethod
+    def interrupt(cls, owner: int) -> None:
+        """
+        Mark the unfinished jobs of a process that no longer exists as interrupted.
+        """
+        with cls.LOCK:
+            if (connection := cls.CONNECTION) is None:
+                return
+            with connection:  # pylint: disable=not-context-manager
+                interrupt(connection, owner)
+
+    @classmethod
+    def data_version(cls) -> int:
+        """
+        Return a number that changes whenever the database is modified by another
+        connection, e.g: by another server process.
+        """
+        with cls.LOCK:
+            if cls.CONNECTION is None:
+                return 0
+            return t.cast(
+                int, cls.CONNECTION.execute("PRAGMA data_version").fetchone()[0]
+            )
+
+    @classmethod
+    def generations(cls) -> dict[str, int]:
+        with cls.LOCK:
+            if cls.CONNECTION is None:
+                return {}
+            rows = cls.CONNECTION.execute("SELECT name, value FROM generations")
+            return {row["name"]: row["value"] for row in rows}
+
+    @classmethod
+    def bump_generation(cls, name: str) -> int:
+        """
+        Increment a generation counter, and return its new value.
+        """
+        with cls.LOCK:
+            if (connection := cls.CONNECTION) is None:
+                return 0
+            with connection:  # pylint: disable=not-context-manager
+                connection.execute(
+                    "INSERT INTO generations (name, value) VALUES (?, 1)"
+                    " ON CONFLICT (name) DO UPDATE SET value = value + 1",
+                    (name,),
+                )
+                row = connection.execute(
+                    "SELECT value FROM generations WHERE name = ?", (name,)
+                ).fetchone()
+        return t.cast(int, row["value"])
+
+    @classmethod
+    def list(
+        cls, before: t.Optional[float] = None, limit: int = constants.ITEMS_PER_PAGE
+    ) -> list[dict[str, t.Any]]:
+        """
+        Return the most recent jobs that were created before the given timestamp, most
+        recent first. Pass the `created_at` value of the last job as `before` argument
+        to fetch the next page.
+        """
+        with cls.LOCK:
+            if cls.CONNECTION is None:
+                return []
+            rows = cls.CONNECTION.execute(
+                "SELECT * FROM jobs WHERE created_at < ?"
+                " ORDER BY created_at DESC LIMIT ?",
+                (float("inf") if before is None else before, limit),
+            ).fetchall()
+        return [to_dict(row) for row in rows]
+
+
+def interrupt(connection: sqlite3.Connection, owner: t.Optional[int]) -> None:
+    connection.execute(
+        "UPDATE jobs SET status = ? WHERE ended_at IS NULL AND owner IS ?",
+        (INTERRUPTED, owner),
+    )
+
+
+def is_alive(pid: int) -> bool:
+    """
+    Return True if a process exists.
+    """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Process exists, but belongs to another user
+        return True
+    return True
+
+
+def prune(connection: sqlite3.Connection) -> None:
+    """
+    Keep only the most recent HISTORY_RETENTION_COUNT jobs.
+    """
+    connection.execute(
+        "DELETE FROM jobs WHERE created_at < ("
+        "SELECT created_at FROM jobs ORDER BY created_at DESC LIMIT 1 OFFSET ?)",
+        (constants.HISTORY_RETENTION_COUNT - 1,),
+    )
+
+
+def to_dict(row: sqlite3.Row) -> dict[str, t.Any]:
+    job = dict(row)
+    job["processes"] = json.loads(job["processes"])
+    job.pop("stop_requested", None)
+    # Logs of old jobs are deleted before their history
+    job["log_available"] = os.path.isdir(job["log_path"])
+    return job
@@ -0,0 +1,74 @@
+import typing as t
+
+# Lock modes: shared locks are compatible with one another, exclusive locks are not
+# compatible with any other lock on the same resource.
+SHARED = "shared"
+EXCLUSIVE = "exclusive"
+
+# Pseudo-resource that conflicts with all other jobs
+ALL = "*"
+
+Locks = dict[str, str]
+
+# Resources that are locked by Tutor commands, indexed by command path. The longest
+# matching path is used. Read-only commands do not lock anything, such that they can
+# run alongside any other command. Unknown commands lock everything.
+COMMAND_LOCKS: dict[tuple[str, ...], Locks] = {
+    ("config", "printroot"): {},
+    ("config", "printvalue"): {},
+    ("config",): {"config": EXCLUSIVE, "env": EXCLUSIVE},
+    ("help",): {},
+    ("images", "printtag"): {},
+    ("images",): {"images": EXCLUSIVE, "config": SHARED, "env": SHARED},
+    ("mounts", "list"): {},
+    ("mounts",): {"config": EXCLUSIVE},
+    ("plugins", "list"): {},
+    ("plugins", "printroot"): {},
+    ("plugins", "search"): {},
+    ("plugins", "show"): {},
+    ("plugins", "update"): {"plugins-index": EXCLUSIVE},
+    ("plugins", "index"): {"plugins-index": EXCLUSIVE},
+    ("plugins", "install"): {"plugins": EXCLUSIVE, "plugins-index": SHARED},
+    ("plugins", "upgrade"): {"plugins": EXCLUSIVE, "plugins-index": SHARED},
+    ("plugins", "uninstall"): {"plugins": EXCLUSIVE},
+    ("plugins",): {"plugins": EXCLUSIVE, "config": EXCLUSIVE, "env": EXCLUSIVE},
+    ("local", "launch"): {
+        "platform": EXCLUSIVE,
+        "config": EXCLUSIVE,
+        "env": EXCLUSIVE,
+        "images": SHARED,
+    },
+    ("local",): {"platform": EXCLUSIVE, "config": SHARED, "env": SHARED},
+    ("dev", "launch"): {
+        "platform": EXCLUSIVE,
+        "config": EXCLUSIVE,
+        "env": EXCLUSIVE,
+        "images": SHARED,
+    },
+    ("dev",): {"platform": EXCLUSIVE, "config": SHARED, "env": SHARED},
+    ("k8s", "launch"): {"platform": EXCLUSIVE, "config": EXCLUSIVE, "env": EXCLUSIVE},
+    ("k8s",): {"platform": EXCLUSIVE, "config": SHARED, "env": SHARED},
+}
+
+
+def command_locks(path: t.Sequence[str]) -> Locks:
+    """
+    Return the locks required by a command, given its command path (e.g: ["local",
+    "launch"]).
+    """
+    for length in range(len(path), 0, -1):
+        if (locks := COMMAND_LOCKS.get(tuple(path[:length]))) is not None:
+            return locks
+    return {ALL: EXCLUSIVE}
+
+
+def conflict(locks1: Locks, locks2: Locks) -> bool:
+    """
+    Return True if two sets of locks cannot be held at the same time.
+    """
+    if ALL in locks1 or ALL in locks2:
+        return True
+    return any(
+        EXCLUSIVE in (locks1[resource], locks2[resource])
+        for resource in locks1.keys() & locks2.keys()
+    )
@@ -0,0 +1,249 @@
+import asyncio
+import collections
+import contextlib
+import threading
+import typing as t
+
+from . import constants
+
+
+class Notifier:
+    """
+    Wake up asyncio tasks from any thread.
+
+    Asyncio events are not thread-safe, so we keep track of the event loop of every
+    waiter and resolve its future from within that loop.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._waiters: list[tuple[asyncio.AbstractEventLoop, asyncio.Future[None]]] = []
+
+    def notify_all(self) -> None:
+        """
+        Wake up all waiting tasks. This may be called from any thread.
+        """
+        with self._lock:
+            waiters, self._waiters = self._waiters, []
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_resolve, future)
+            except RuntimeError:
+                # Event loop is closed
+                pass
+
+    async def wait_for(self, predicate: t.Callable[[], bool]) -> None:
+        """
+        Wait until the predicate is true. The predicate is evaluated after every
+        notification. Writers should always modify the state before notifying.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            waiter = (loop, loop.create_future())
+            with self._lock:
+                # Evaluating the predicate while holding the lock guarantees that we
+                # do not miss any notification.
+                if predicate():
+                    return
+                self._waiters.append(waiter)
+            try:
+                await waiter[1]
+            finally:
+                with self._lock:
+                    if waiter in self._waiters:
+                        self._waiters.remove(waiter)
+
+
+def _resolve(future: "asyncio.Future[None]") -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class LogBroker:
+    """
+    Keep the most recent content of a log file in memory, and notify subscribers
+    whenever new content is published.
+
+    Content is also expected to be persisted by the publisher, such that subscribers can
+    catch up with content that was evicted from memory: the reader function returns up
+    to `size` bytes of persisted content, starting at `offset`.
+    """
+
+    def __init__(
+        self,
+        reader: t.Callable[[int, int], bytes],
+        max_bytes: int = constants.LOG_BUFFER_MAX_BYTES,
+    ) -> None:
+        self.reader = reader
+        self.max_bytes = max_bytes
+        self.notifier = Notifier()
+        self._lock = threading.Lock()
+        self._chunks: collections.deque[bytes] = collections.deque()
+        self._buffer_size = 0
+        # Offset of the first byte that is stored in memory
+        self.start_offset = 0
+        # Total number of bytes that were published
+        self.end_offset = 0
+        self.closed = False
+
+    def publish(self, content: bytes) -> None:
+        """
+        Store content in the ring buffer and wake up subscribers.
+        """
+        if not content:
+            return
+        with self._lock:
+            self._append(content)
+        self.notifier.notify_all()
+
+    def close(self, content: bytes = b"") -> None:
+        """
+        Publish some final content and mark the log as complete. Both are performed
+        atomically, such that subscribers never receive the last chunk while the log
+        is still marked as open.
+        """
+        with self._lock:
+            if content:
+                self._append(content)
+            self.closed = True
+        self.notifier.notify_all()
+
+    def _append(self, content: bytes) -> None:
+        self._chunks.append(content)
+        self._buffer_size += len(content)
+        self.end_offset += len(content)
+        # Evict old content, but always keep the last chunk
+        while self._buffer_size > self.max_bytes and len(self._chunks) > 1:
+            evicted = self._chunks.popleft()
+            self._buffer_size -= len(evicted)
+            self.start_offset += len(evicted)
+
+    def read(self, offset: int) -> t.Optional[bytes]:
+        """
+        Return in-memory content starting from the offset. Return None if that content
+        was already evicted from memory.
+        """
+        with self._lock:
+            if offset < self.start_offset:
+                return None
+            position = self.start_offset
+            content = []
+            for chunk in self._chunks:
+                if position + len(chunk) > offset:
+                    content.append(chunk[max(0, offset - position) :])
+                position += len(chunk)
+            return b"".join(content)
+
+    async def iter_chunks(self, offset: int = 0) -> t.AsyncIterator[bytes]:
+        """
+        Iterate on log content, starting from the offset, until the log is closed.
+
+        Subscribers do not consume any resource while waiting for new content.
+        """
+        while True:
+            await self.notifier.wait_for(
+                lambda: self.end_offset > offset or self.closed
+            )
+            content = self.read(offset)
+            if content is None:
+                # Content was evicted from memory: catch up from persisted content
+                content = await self.read_persisted(offset, self.start_offset - offset)
+                if not content:
+                    # Content was deleted: skip it
+                    offset = self.start_offset
+                    continue
+            if content:
+                offset += len(content)
+                yield content
+            elif self.closed:
+                return
+
+    async def read_persisted(self, offset: int, size: int) -> bytes:
+        """
+        Read persisted content in a separate thread, without blocking the event loop.
+        """
+        return await asyncio.to_thread(self.reader, offset, size)
+
+
+class LogChunk(t.NamedTuple):
+    """
+    Decoded log content, along with the identifier of the log it was read from, the
+    byte offset of the end of the content in that log, and the number of the line on
+    which the content starts.
+    """
+
+    source: str
+    text: str
+    offset: int
+    line: int = 0
+
+
+async def iter_batches(
+    source: t.AsyncIterator[LogChunk], max_bytes: int, max_delay: float
+) -> t.AsyncGenerator[LogChunk, None]:
+    """
+    Coalesce chunks from the source iterator into larger batches.
+
+    A batch is yielded as soon as it reaches max_bytes, or max_delay seconds after its
+    first chunk was received. Chunks are never split, so a batch may be larger than
+    max_bytes. Chunks from different sources are never merged.
+    """
+    queue: asyncio.Queue[t.Optional[LogChunk]] = asyncio.Queue(maxsize=16)
+    errors: list[Exception] = []
+
+    async def produce() -> None:
+        try:
+            async for item in source:
+                await queue.put(item)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            errors.append(e)
+        await queue.put(None)
+
+    loop = asyncio.get_running_loop()
+    producer = asyncio.create_task(produce())
+    # Items are dequeued by a task that outlives timeouts, such that dequeued items are
+    # never lost: when it is not done in time, it is awaited by the next batch.
+    next_item: t.Optional[asyncio.Task[t.Optional[LogChunk]]] = None
+    try:
+        # Chunk that was received but does not belong to the previous batch
+        pending: t.Optional[LogChunk] = None
+        finished = False
+        while not finished:
+            if pending is None:
+                next_item = next_item or asyncio.create_task(queue.get())
+                pending = await next_item
+                next_item = None
+                if pending is None:
+                    break
+            batch, pending = [pending], None
+            size = len(batch[0].text)
+            deadline = loop.time() + max_delay
+            while size < max_bytes and (timeout := deadline - loop.time()) > 0:
+                next_item = next_item or asyncio.create_task(queue.get())
+                done, _pending = await asyncio.wait([next_item], timeout=timeout)
+                if not done:
+                    break
+                item = next_item.result()
+                next_item = None
+                if item is None:
+                    finished = True
+                    break
+                if item.source != batch[0].source:
+                    pending = item
+                    break
+                batch.append(item)
+                size += len(item.text)
+            yield LogChunk(
+                batch[0].source,
+                "".join(c.text for c in batch),
+                batch[-1].offset,
+                batch[0].line,
+            )
+        if errors:
+            raise errors[0]
+    finally:
+        for task in (next_item, producer):
+            if task is not None:
+                task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await task
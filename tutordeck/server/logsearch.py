@@ -0,0 +1,114 @@
+import collections
+import re
+import typing as t
+
+# Log levels, by increasing severity
+WARNING = "warning"
+ERROR = "error"
+LEVELS = ("", WARNING, ERROR)
+
+# Terminal escape sequences, such as colors, are not part of the searched text
+ANSI_ESCAPE_PATTERN = re.compile(r"\x1b\[[0-9;?]*[ -/]*[@-~]|\x1b[@-Z\\-_]")
+# Level heuristics: lines that start with a pattern, or that contain a keyword. Keywords
+# are first searched as plain substrings, which is much faster than regular expressions.
+ERROR_LINE_PATTERN = re.compile(
+    r"Traceback \(most recent call last\)|[\w.]*(?:Error|Exception)\b|Failed!"
+)
+ERROR_KEYWORDS = ("ERROR", "CRITICAL", "FATAL")
+ERROR_KEYWORDS_PATTERN = re.compile(r"\b(?:ERROR|CRITICAL|FATAL)\b")
+WARNING_LINE_PATTERN = re.compile(r"[\w.]*Warning\b|⚠️")
+WARNING_KEYWORDS = ("WARN",)
+WARNING_KEYWORDS_PATTERN = re.compile(r"\bWARN(?:ING)?\b")
+
+
+class LogMatch(t.NamedTuple):
+    """
+    Log line that matches a search, with its context lines.
+    """
+
+    line: int
+    # Byte offset of the start of the line in the log
+    offset: int
+    text: str
+    level: str
+    before: list[str]
+    after: list[str]
+
+    def to_dict(self) -> dict[str, t.Any]:
+        return {
+            "line": self.line,
+            "offset": self.offset,
+            "text": self.text,
+            "level": self.level,
+            "before": self.before,
+            "after": self.after,
+        }
+
+
+def get_level(text: str) -> str:
+    """
+    Guess the level of a log line.
+    """
+    if ERROR_LINE_PATTERN.match(text) or has_keyword(
+        text, ERROR_KEYWORDS, ERROR_KEYWORDS_PATTERN
+    ):
+        return ERROR
+    if WARNING_LINE_PATTERN.match(text) or has_keyword(
+        text, WARNING_KEYWORDS, WARNING_KEYWORDS_PATTERN
+    ):
+        return WARNING
+    return ""
+
+
+def has_keyword(text: str, keywords: tuple[str, ...], pattern: re.Pattern[str]) -> bool:
+    return any(keyword in text for keyword in keywords) and bool(pattern.search(text))
+
+
+def compile_pattern(
+    query: str, regex: bool = False, case_sensitive: bool = False
+) -> t.Optional[re.Pattern[str]]:
+    """
+    Compile a substring or regular expression query. Raise re.error on invalid regular
+    expressions. Return None for empty queries, which match all lines.
+    """
+    if not query:
+        return None
+    return re.compile(
+        query if regex else re.escape(query), 0 if case_sensitive else re.IGNORECASE
+    )
+
+
+def search(
+    lines: t.Iterable[tuple[int, bytes]],
+    first_line: int = 0,
+    pattern: t.Optional[re.Pattern[str]] = None,
+    min_level: str = "",
+    context: int = 0,
+) -> t.Iterator[LogMatch]:
+    """
+    Iterate on the (byte offset, content) lines of a log, and yield the lines that
+    match both the pattern and the minimum level, with up to `context` lines before and
+    after each match.
+
+    Lines are consumed one at a time, such that logs of any size can be searched in
+    constant memory.
+    """
+    min_severity = LEVELS.index(min_level)
+    before: collections.deque[str] = collections.deque(maxlen=context)
+    # Matches that are waiting for their "after" context lines
+    pending: collections.deque[LogMatch] = collections.deque()
+    for number, (offset, content) in enumerate(lines, first_line):
+        text = content.decode(errors="replace")
+        if "\x1b" in text:
+            text = ANSI_ESCAPE_PATTERN.sub("", text)
+        for match in pending:
+            match.after.append(text)
+        # The level is only guessed for lines that match the pattern
+        if pattern is None or pattern.search(text):
+            level = get_level(text)
+            if LEVELS.index(level) >= min_severity:
+                pending.append(LogMatch(number, offset, text, level, list(before), []))
+        while pending and len(pending[0].after) >= context:
+            yield pending.popleft()
+        before.append(text)
+    yield from pending
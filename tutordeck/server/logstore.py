@@ -0,0 +1,453 @@
+import bisect
+import concurrent.futures
+import gzip
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import threading
+import time
+import typing as t
+
+from . import constants
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None  # type: ignore[assignment,unused-ignore]
+
+# Segment file extensions, by compression method
+EXTENSIONS = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+# Line index file: offset of every LOG_INDEX_INTERVAL_LINES-th line, as 64-bit integers
+INDEX_FILENAME = "lines.idx"
+INDEX_ENTRY = struct.Struct("<Q")
+
+
+class LogWriter:
+    """
+    Write the log of a single job to a directory of size-capped segments.
+
+    Each segment is named after the offset of its first byte in the log, such that the
+    log can be read from any offset without an external index. Segments are rotated when
+    they reach LOG_SEGMENT_MAX_BYTES, and finished segments are compressed in the
+    background. Only the most recent LOG_MAX_SEGMENTS_PER_JOB segments are kept.
+
+    The current segment is kept open with a buffered file object. Thus, content might
+    not be visible on disk until `flush` is called.
+
+    Lines are counted as they are written, and the offset of every
+    LOG_INDEX_INTERVAL_LINES-th line is appended to a sparse index, such that any line
+    can be found without reading the log from the start.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.size = 0
+        # Number of complete lines, and offset of the current line
+        self.lines = 0
+        self._line_start = 0
+        self._lock = threading.Lock()
+        self._segment_start = 0
+        self._file = self._open_segment()
+        self._index_file = open(  # pylint: disable=consider-using-with
+            os.path.join(directory, INDEX_FILENAME), "ab", buffering=0
+        )
+
+    @property
+    def line_count(self) -> int:
+        """
+        Number of lines, including the last incomplete line.
+        """
+        return self.lines + (1 if self.size > self._line_start else 0)
+
+    def write(self, content: bytes) -> None:
+        with self._lock:
+            if self._file.closed:
+                raise ValueError(f"Log is closed: {self.directory}")
+            self._file.write(content)
+            self._index_lines(content)
+            self.size += len(content)
+            if self.size - self._segment_start >= constants.LOG_SEGMENT_MAX_BYTES:
+                self._rotate()
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_segment()
+            self._index_file.close()
+
+    def _index_lines(self, content: bytes) -> None:
+        newlines = content.count(b"\n")
+        if newlines == 0:
+            return
+        interval = constants.LOG_INDEX_INTERVAL_LINES
+        last_newline = -1
+        if self.lines % interval + newlines >= interval:
+            # Find the indexed lines
+            for line in range(self.lines + 1, self.lines + newlines + 1):
+                last_newline = content.index(b"\n", last_newline + 1)
+                if line % interval == 0:
+                    self._index_file.write(
+                        INDEX_ENTRY.pack(self.size + last_newline + 1)
+                    )
+        else:
+            last_newline = content.rindex(b"\n")
+        self.lines += newlines
+        self._line_start = self.size + last_newline + 1
+
+    def _close_segment(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+            LogStore.compress_later(self._file.name)
+
+    def _rotate(self) -> None:
+        self._close_segment()
+        self._segment_start = self.size
+        self._file = self._open_segment()
+        # Delete oldest segments
+        for _start, path in list_segments(self.directory)[
+            : -constants.LOG_MAX_SEGMENTS_PER_JOB
+        ]:
+            remove_file(path)
+
+    def _open_segment(self) -> t.BinaryIO:
+        path = os.path.join(self.directory, segment_name(self._segment_start))
+        return open(  # pylint: disable=consider-using-with
+            path, "ab", buffering=constants.LOG_WRITE_BUFFER_BYTES
+        )
+
+
+class LogStore:
+    """
+    Keep the logs of all jobs in a common directory, with bounded disk usage.
+
+    The logs of every job are stored in a separate sub-directory. Logs of completed jobs
+    are deleted when there are more than LOG_RETENTION_COUNT of them, or when they are
+    older than LOG_RETENTION_SECONDS.
+    """
+
+    DIRECTORY: str = os.path.join(tempfile.gettempdir(), "tutor-deck", "logs")
+    # Writers of the logs that are currently open, indexed by log name
+    WRITERS: dict[str, LogWriter] = {}
+    LOCK = threading.Lock()
+    # Segments are compressed one at a time, in the background
+    COMPRESSOR = concurrent.futures.ThreadPoolExecutor(
+        max_workers=1, thread_name_prefix="tutor-deck-log-compressor"
+    )
+
+    @classmethod
+    def create(cls, name: str) -> LogWriter:
+        """
+        Create a new log, and delete old logs.
+        """
+        with cls.LOCK:
+            writer = LogWriter(os.path.join(cls.DIRECTORY, name))
+            cls.WRITERS[name] = writer
+        cls.prune()
+        return writer
+
+    @classmethod
+    def release(cls, name: str) -> None:
+        """
+        Mark a log as complete: it is no longer protected from retention.
+        """
+        with cls.LOCK:
+            cls.WRITERS.pop(name, None)
+
+    @classmethod
+    def flush(cls) -> None:
+        """
+        Write the buffered content of all open logs, such that it can be read by other
+        processes.
+        """
+        with cls.LOCK:
+            writers = list(cls.WRITERS.values())
+        for writer in writers:
+            writer.flush()
+
+    @classmethod
+    def read(cls, name: str, offset: int, size: int) -> bytes:
+        """
+        Read up to `size` bytes of a log, starting at the offset. Return empty bytes if
+        that content no longer exists.
+
+        Buffered content of open logs is flushed first, such that readers always see
+        the latest content.
+        """
+        with cls.LOCK:
+            writer = cls.WRITERS.get(name)
+        if writer:
+            writer.flush()
+        directory = os.path.join(cls.DIRECTORY, name)
+        try:
+            return read_segments(directory, offset, size)
+        except FileNotFoundError:
+            # A segment was compressed or deleted while we were reading it
+            return read_segments(directory, offset, size)
+
+    @classmethod
+    def iter_chunks(cls, name: str, offset: int = 0) -> t.Iterator[bytes]:
+        """
+        Iterate on the content of a log, from the offset to the current end of the log.
+
+        Unlike `read`, every segment is opened only once and read sequentially, such
+        that compressed segments are not decompressed again for every chunk.
+        """
+        directory = os.path.join(cls.DIRECTORY, name)
+        while True:
+            with cls.LOCK:
+                writer = cls.WRITERS.get(name)
+            if writer:
+                writer.flush()
+            try:
+                segments = list_segments(directory)
+            except FileNotFoundError:
+                return
+            segment = None
+            for start, path in segments:
+                if start > offset:
+                    break
+                segment = (start, path)
+            if segment is None:
+                # Content was deleted
+                return
+            start_offset = offset
+            # Segments that are being read remain readable if they are compressed or
+            # deleted in the meantime
+            with open_segment(segment[1]) as f:
+                f.seek(offset - segment[0])
+                while chunk := f.read(constants.LOG_READ_CHUNK_BYTES):
+                    offset += len(chunk)
+                    yield chunk
+            if offset == start_offset:
+                # End of log
+                return
+
+    @classmethod
+    def iter_lines(cls, name: str, start: int = 0) -> t.Iterator[tuple[int, bytes]]:
+        """
+        Iterate on the (byte offset, content) of the lines of a log, without trailing
+        newline, starting from line number `start`. The line index is used to skip the
+        lines before the closest indexed line. The last line might be incomplete.
+        """
+        line, offset = read_line_index(os.path.join(cls.DIRECTORY, name), start)
+        buffer = b""
+        for chunk in cls.iter_chunks(name, offset):
+            *complete_lines, buffer = (buffer + chunk).split(b"\n")
+            for content in complete_lines:
+                if line >= start:
+                    yield offset, content
+                offset += len(content) + 1
+                line += 1
+        if buffer and line >= start:
+            yield offset, buffer
+
+    @classmethod
+    def read_lines(cls, name: str, start: int, count: int) -> list[tuple[int, bytes]]:
+        """
+        Return the (byte offset, content) of up to `count` lines, starting from line
+        number `start`.
+        """
+        lines: list[tuple[int, bytes]] = []
+        for line in cls.iter_lines(name, start):
+            if len(lines) >= count:
+                break
+            lines.append(line)
+        return lines
+
+    @classmethod
+    def line_count(cls, name: str) -> int:
+        """
+        Return the number of lines of a log. Only the lines after the last indexed
+        line need to be read.
+        """
+        with cls.LOCK:
+            writer = cls.WRITERS.get(name)
+        if writer:
+            return writer.line_count
+        line, _offset = read_line_index(os.path.join(cls.DIRECTORY, name), sys.maxsize)
+        return line + sum(1 for _line in cls.iter_lines(name, line))
+
+    @classmethod
+    def line_number(cls, name: str, offset: int) -> int:
+        """
+        Return the number of the line that contains the byte at the offset. Only the
+        lines after the closest indexed line need to be read.
+        """
+        line, line_offset = find_indexed_line(os.path.join(cls.DIRECTORY, name), offset)
+        for chunk in cls.iter_chunks(name, line_offset):
+            line += chunk.count(b"\n", 0, offset - line_offset)
+            line_offset += len(chunk)
+            if line_offset >= offset:
+                break
+        return line
+
+    @classmethod
+    def prune(cls) -> None:
+        """
+        Delete old logs, except for those that are open.
+        """
+        try:
+            names = os.listdir(cls.DIRECTORY)
+        except FileNotFoundError:
+            return
+        with cls.LOCK:
+            names = [name for name in names if name not in cls.WRITERS]
+        logs_by_age: list[tuple[float, str]] = []
+        for name in names:
+            try:
+                logs_by_age.append(
+                    (os.stat(os.path.join(cls.DIRECTORY, name)).st_mtime, name)
+                )
+            except FileNotFoundError:
+                pass
+        logs_by_age.sort(reverse=True)
+        min_mtime = time.time() - constants.LOG_RETENTION_SECONDS
+        for index, (mtime, name) in enumerate(logs_by_age):
+            if index >= constants.LOG_RETENTION_COUNT or mtime < min_mtime:
+                shutil.rmtree(os.path.join(cls.DIRECTORY, name), ignore_errors=True)
+
+    @classmethod
+    def compress_later(cls, path: str) -> None:
+        if constants.LOG_COMPRESSION != "none":
+            cls.COMPRESSOR.submit(compress_segment, path, constants.LOG_COMPRESSION)
+
+
+def segment_name(start: int) -> str:
+    return f"{start:016d}.log"
+
+
+def list_segments(directory: str) -> list[tuple[int, str]]:
+    """
+    Return the (start offset, path) of all segments of a log, sorted by offset. When a
+    segment exists both in compressed and uncompressed form, the uncompressed file is
+    the one that is being compressed, so we ignore it.
+    """
+    segments: dict[int, str] = {}
+    for filename in os.listdir(directory):
+        start, _sep, extension = filename.partition(".log")
+        if not start.isdigit() or extension not in EXTENSIONS.values():
+            continue
+        if int(start) not in segments or extension:
+            segments[int(start)] = os.path.join(directory, filename)
+    return sorted(segments.items())
+
+
+def read_segments(directory: str, offset: int, size: int) -> bytes:
+    """
+    Read content that may span multiple segments.
+    """
+    try:
+        segments = list_segments(directory)
+    except FileNotFoundError:
+        return b""
+    content = []
+    for index, (start, path) in enumerate(segments):
+        if index + 1 < len(segments) and offset >= segments[index + 1][0]:
+            # Content belongs to a later segment
+            continue
+        if offset < start:
+            # Content was deleted
+            break
+        with open_segment(path) as f:
+            f.seek(offset - start)
+            chunk = f.read(size)
+        content.append(chunk)
+        offset += len(chunk)
+        size -= len(chunk)
+        if size <= 0:
+            break
+    return b"".join(content)
+
+
+def read_line_index(directory: str, line: int) -> tuple[int, int]:
+    """
+    Return the (line number, byte offset) of the closest indexed line that is not after
+    `line`.
+    """
+    entry = line // constants.LOG_INDEX_INTERVAL_LINES
+    try:
+        with open(os.path.join(directory, INDEX_FILENAME), "rb") as f:
+            # Ignore incomplete entries
+            entry = min(entry, os.fstat(f.fileno()).st_size // INDEX_ENTRY.size)
+            if entry == 0:
+                return 0, 0
+            f.seek((entry - 1) * INDEX_ENTRY.size)
+            (offset,) = INDEX_ENTRY.unpack(f.read(INDEX_ENTRY.size))
+    except FileNotFoundError:
+        return 0, 0
+    return entry * constants.LOG_INDEX_INTERVAL_LINES, t.cast(int, offset)
+
+
+def find_indexed_line(directory: str, offset: int) -> tuple[int, int]:
+    """
+    Return the (line number, byte offset) of the closest indexed line that does not
+    start after the offset.
+    """
+    try:
+        with open(os.path.join(directory, INDEX_FILENAME), "rb") as f:
+            index = f.read()
+    except FileNotFoundError:
+        return 0, 0
+    # Ignore incomplete entries
+    index = index[: len(index) - len(index) % INDEX_ENTRY.size]
+    offsets = [entry[0] for entry in INDEX_ENTRY.iter_unpack(index)]
+    entry = bisect.bisect_right(offsets, offset)
+    if entry == 0:
+        return 0, 0
+    return entry * constants.LOG_INDEX_INTERVAL_LINES, t.cast(int, offsets[entry - 1])
+
+
+def open_segment(path: str) -> t.BinaryIO:
+    """
+    Open a segment for reading, regardless of its compression.
+    """
+    if path.endswith(EXTENSIONS["gzip"]):
+        return t.cast(t.BinaryIO, gzip.open(path, "rb"))
+    if path.endswith(EXTENSIONS["zstd"]):
+        if zstandard is None:
+            raise ValueError(
+                f"Install 'zstandard' to read zstd-compressed logs: {path}"
+            )
+        return t.cast(
+            t.BinaryIO,
+            zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True),
+        )
+    return open(path, "rb")  # pylint: disable=consider-using-with
+
+
+def compress_segment(path: str, compression: str) -> None:
+    """
+    Compress a segment, then delete the uncompressed file. The compressed file is
+    written under a temporary name, such that readers never see partial content.
+    """
+    if compression == "zstd" and zstandard is None:
+        compression = "gzip"
+    compressed_path = path + EXTENSIONS[compression]
+    tmp_path = compressed_path + ".tmp"
+    try:
+        with open(path, "rb") as src:
+            if compression == "zstd":
+                with open(tmp_path, "wb") as dst:
+                    zstandard.ZstdCompressor().copy_stream(src, dst)
+            else:
+                with gzip.open(tmp_path, "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+        os.replace(tmp_path, compressed_path)
+        os.remove(path)
+    except FileNotFoundError:
+        # Segment or log was deleted in the meantime
+        remove_file(tmp_path)
+
+
+def remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
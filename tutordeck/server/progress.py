@@ -0,0 +1,180 @@
+import re
+import threading
+import time
+import typing as t
+
+from . import constants, logs
+
+# Layer progress of "docker pull" and "docker compose pull", e.g:
+#   3f4ca61aafcd Downloading [==>        ]  1.2MB/29.12MB
+LAYER_PATTERN = re.compile(
+    rb"\b(?P<layer>[0-9a-f]{12}) (?P<status>Pulling fs layer|Waiting|Downloading"
+    rb"|Verifying Checksum|Download complete|Extracting|Pull complete|Already exists)"
+    rb"(?:\s+\[[=> ]*\]\s+(?P<current>[\d.]+\s?[kMGT]?B)/(?P<total>[\d.]+\s?[kMGT]?B))?"
+    rb"\s*$"
+)
+# Blob progress of buildkit builds with plain output, e.g:
+#   #5 sha256:3f4ca61aafcd 10.49MB / 30.23MB 0.3s
+BUILDKIT_PATTERN = re.compile(
+    rb"^#\d+ (?P<layer>sha256:[0-9a-f]+) (?P<current>[\d.]+\s?[kMGT]?B)"
+    rb" / (?P<total>[\d.]+\s?[kMGT]?B) [\d.]+s(?P<done> done)?\s*$"
+)
+# Beginning of lines that might be progress lines, once they are complete
+PROGRESS_PREFIX_PATTERN = re.compile(
+    rb"^\s*(?:[0-9a-f]{0,12}|#\d*)$|\b[0-9a-f]{12} |^#"
+)
+# Layer statuses that are written to the logs
+DONE_STATUSES = (b"Pull complete", b"Already exists")
+# Layer statuses that are reported once a layer was downloaded
+DOWNLOADED_STATUSES = (b"Verifying Checksum", b"Download complete", b"Extracting")
+SIZE_UNITS = {"B": 1, "kB": 10**3, "MB": 10**6, "GB": 10**9, "TB": 10**12}
+
+
+class Layer(t.NamedTuple):
+    done: bool
+    current: int
+    total: int
+
+
+class ProgressTracker:
+    """
+    Latest progress of all image layers that are pulled or built by a command.
+
+    Subscribers are notified whenever progress changes.
+    """
+
+    def __init__(self) -> None:
+        self.layers: dict[bytes, Layer] = {}
+        self.version = 0
+        self.notifier = logs.Notifier()
+        self._lock = threading.Lock()
+
+    def update(
+        self,
+        layer: bytes,
+        done: bool = False,
+        downloaded: bool = False,
+        current: int = 0,
+        total: int = 0,
+    ) -> None:
+        with self._lock:
+            if previous := self.layers.get(layer):
+                # Keep sizes that were reported by earlier statuses
+                done = done or previous.done
+                total = total or previous.total
+                current = current or previous.current
+            if done or downloaded:
+                current = total
+            self.layers[layer] = Layer(done, current, total)
+            self.version += 1
+        self.notifier.notify_all()
+
+    def to_dict(self) -> dict[str, int]:
+        with self._lock:
+            layers = list(self.layers.values())
+        return {
+            "layers_done": sum(1 for layer in layers if layer.done),
+            "layers_total": len(layers),
+            "bytes_done": sum(layer.current for layer in layers),
+            "bytes_total": sum(layer.total for layer in layers),
+        }
+
+
+class ProgressFilter:
+    """
+    Log pipeline stage that removes progress updates from command output.
+
+    Layer progress lines of docker pulls and builds are removed from the output, and
+    tracked instead by the progress tracker. Only the final status of every layer is
+    kept. Other lines that are rewritten with carriage returns are kept at most once
+    every PROGRESS_REWRITE_INTERVAL_SECONDS.
+
+    Content is processed one line at a time. Incomplete lines are only held back when
+    they might be progress lines: other content is written as soon as possible.
+    """
+
+    def __init__(self, tracker: ProgressTracker) -> None:
+        self.tracker = tracker
+        self._pending = b""
+        # True if the beginning of the current line was already written
+        self._line_started = False
+        self._last_rewrite = 0.0
+
+    def feed(self, content: bytes) -> bytes:
+        """
+        Process a chunk of output, and return the content that should be written.
+        """
+        content = self._pending + content
+        output: list[bytes] = []
+        position = 0
+        for match in re.finditer(rb"\r\n|\r(?=.)|\n", content, re.DOTALL):
+            output.append(self._filter_line(content[position : match.start()], match))
+            position = match.end()
+        remaining = content[position:]
+        if self._line_started or not (
+            remaining.endswith(b"\r") or PROGRESS_PREFIX_PATTERN.search(remaining)
+        ):
+            output.append(remaining)
+            self._line_started = self._line_started or bool(remaining)
+            remaining = b""
+        self._pending = remaining
+        return b"".join(output)
+
+    def flush(self) -> bytes:
+        """
+        Return the content that was held back.
+        """
+        content, self._pending = self._pending, b""
+        return content
+
+    def _filter_line(self, line: bytes, terminator: re.Match[bytes]) -> bytes:
+        line_started, self._line_started = self._line_started, False
+        if line_started:
+            return line + terminator.group()
+        if match := LAYER_PATTERN.search(line):
+            status = match.group("status")
+            done = status in DONE_STATUSES
+            if status == b"Downloading":
+                self.tracker.update(
+                    match.group("layer"),
+                    current=parse_size(match.group("current")),
+                    total=parse_size(match.group("total")),
+                )
+            else:
+                # Sizes of other statuses, such as extraction, are ignored
+                self.tracker.update(
+                    match.group("layer"),
+                    done=done,
+                    downloaded=status in DOWNLOADED_STATUSES,
+                )
+            return line + b"\n" if done else b""
+        if match := BUILDKIT_PATTERN.search(line):
+            done = bool(match.group("done"))
+            self.tracker.update(
+                match.group("layer"),
+                done=done,
+                current=parse_size(match.group("current")),
+                total=parse_size(match.group("total")),
+            )
+            return line + b"\n" if done else b""
+        if terminator.group() == b"\r":
+            now = time.monotonic()
+            if now - self._last_rewrite < constants.PROGRESS_REWRITE_INTERVAL_SECONDS:
+                return b""
+            self._last_rewrite = now
+        return line + terminator.group()
+
+
+def parse_size(size: t.Optional[bytes]) -> int:
+    """
+    Parse docker sizes, such as "12.3MB".
+    """
+    if not size:
+        return 0
+    match = re.match(rb"([\d.]+)\s?([kMGT]?B)", size)
+    if not match:
+        return 0
+    try:
+        return int(float(match.group(1)) * SIZE_UNITS[match.group(2).decode()])
+    except ValueError:
+        return 0
@@ -3,6 +3,9 @@
 // 1) calling functions to set and display toast messages
 // 2) calling functions to toggle command execution/cancellation buttons
 // 3) logs scrolling
+// 4) windowed display of the logs
+// 5) progress of docker pulls and builds
+// 6) updates of the installed plugins
 
 // Each page that uses logs defines its own command execution/cancellation toggle functions with the same signature
 // We can safely call these functions and their functionality will be handeled by the page specific js
@@ -44,20 +47,224 @@ function checkAndClearCommandExecuted() {
 };
 checkAndClearCommandExecuted();
 
+// Windowed log display
+// Logs are received as HTML, where every line is self-contained: styled spans never
+// extend beyond a newline. Logs are split in pages of LOG_PAGE_LINES lines. Only the pages that are close to the
+// visible part of the logs are kept in the DOM: other pages are replaced by empty
+// placeholders of the same height, and their content is fetched again from the server
+// when they are scrolled into view. Live content is always appended to the last page,
+// which is never removed.
+const LOG_PAGE_LINES = 500;
+// Job whose logs are displayed
+let logsJob = null;
+// Number of the line on which the next streamed content starts
+let logsEndLine = 0;
+// Page elements, indexed by page number
+let logPages = [];
+// Nodes of the last line, which are removed when the line is rewritten
+let logsLastLineNodes = [];
+const logPagesObserver = new IntersectionObserver(onLogPagesIntersect, {
+	root: logsElement,
+	rootMargin: "200% 0px",
+});
+
+function resetLogs(jobId, firstLine) {
+	logPagesObserver.disconnect();
+	logsElement.replaceChildren();
+	logPages = [];
+	logsLastLineNodes = [];
+	logsJob = jobId;
+	logsEndLine = firstLine;
+	const firstPage = getLogPage(firstLine);
+	const firstPageStart = Number(firstPage.dataset.page) * LOG_PAGE_LINES;
+	if (firstLine > firstPageStart) {
+		// Streaming started in the middle of the page: fetch its first lines
+		fetchLogLines(jobId, firstPageStart, firstLine - firstPageStart).then((html) => {
+			if (jobId === logsJob && firstPage.dataset.loaded === "true") {
+				firstPage.prepend(parseLogsHtml(html));
+			}
+		});
+	}
+}
+
+function appendLogs(html, line) {
+	// Content might have been skipped: missing lines are fetched when they are displayed
+	if (line > logsEndLine) {
+		logsEndLine = line;
+		logsLastLineNodes = [];
+	}
+	const parts = html.split("\n");
+	parts.forEach((part, index) => {
+		if (part.startsWith("\r")) {
+			// The last line was rewritten
+			logsLastLineNodes.forEach((node) => node.remove());
+			logsLastLineNodes = [];
+			part = part.slice(1);
+		}
+		const isLastPart = index === parts.length - 1;
+		const fragment = parseLogsHtml(isLastPart ? part : part + "\n");
+		logsLastLineNodes.push(...fragment.childNodes);
+		getLogPage(logsEndLine).append(fragment);
+		if (!isLastPart) {
+			logsEndLine += 1;
+			logsLastLineNodes = [];
+		}
+	});
+}
+
+function parseLogsHtml(html) {
+	return document.createRange().createContextualFragment(html);
+}
+
+// Return the page that contains a line. Missing earlier pages are created as empty
+// placeholders.
+function getLogPage(line) {
+	const pageNumber = Math.floor(line / LOG_PAGE_LINES);
+	const estimatedHeight = LOG_PAGE_LINES * (parseFloat(getComputedStyle(logsElement).lineHeight) || 20);
+	while (logPages.length <= pageNumber) {
+		const page = document.createElement("span");
+		page.classList.add("log-page");
+		page.dataset.page = logPages.length;
+		if (logPages.length < pageNumber) {
+			page.dataset.loaded = "false";
+			page.style.height = estimatedHeight + "px";
+		} else {
+			page.dataset.loaded = "true";
+		}
+		logPages.push(page);
+		logsElement.appendChild(page);
+		logPagesObserver.observe(page);
+	}
+	return logPages[pageNumber];
+}
+
+function onLogPagesIntersect(entries) {
+	entries.forEach((entry) => {
+		const page = entry.target;
+		if (entry.isIntersecting) {
+			if (page.dataset.loaded === "false") {
+				loadLogPage(page);
+			}
+		} else if (page.dataset.loaded === "true" && page !== logPages[logPages.length - 1]) {
+			// Keep the same height, such that the scroll position does not change
+			page.style.height = page.offsetHeight + "px";
+			page.replaceChildren();
+			page.dataset.loaded = "false";
+		}
+	});
+}
+
+async function loadLogPage(page) {
+	const jobId = logsJob;
+	page.dataset.loaded = "loading";
+	const html = await fetchLogLines(jobId, Number(page.dataset.page) * LOG_PAGE_LINES, LOG_PAGE_LINES);
+	if (jobId !== logsJob) {
+		return;
+	}
+	page.innerHTML = html;
+	page.style.height = "";
+	page.dataset.loaded = "true";
+}
+
+async function fetchLogLines(jobId, start, count) {
+	const response = await fetch(`/cli/jobs/${jobId}/lines?start=${start}&count=${count}`);
+	if (!response.ok) {
+		return "";
+	}
+	const data = await response.json();
+	return data.lines.map((line) => line.html + "\n").join("");
+}
+
 let threadWasAlive = false;
+// Logs, command and status are sent as separate events. Commands and status are only
+// sent when they change.
+let currentCommand = "";
+let currentJob = null;
+let lastStdout = "";
 htmx.on("htmx:sseBeforeMessage", function (evt) {
 	// Don't swap content, we want to append
 	evt.preventDefault();
 	const data = JSON.parse(evt.detail.data);
-	evt.detail.elt.appendChild(document.createTextNode(data.stdout));
+	if (evt.detail.type === "command") {
+		currentCommand = data.command;
+		currentJob = data.job;
+	} else if (evt.detail.type === "status") {
+		onStatusChange(data.thread_alive);
+	} else if (evt.detail.type === "progress") {
+		onProgressChange(data);
+	} else if (evt.detail.type === "plugins") {
+		onPluginsChange(data);
+	} else {
+		if (currentJob !== logsJob) {
+			resetLogs(currentJob, data.line);
+		}
+		appendLogs(data.html, data.line);
+		lastStdout = data.html;
+		scrollLogs(evt.detail.elt);
+		updateLogsResumePosition(evt.detail.lastEventId);
+	}
+});
+
+// The browser automatically resumes the stream from the last event ID when it
+// reconnects. But when htmx re-creates the event source, we need to explicitly pass
+// the last event ID, so that we don't receive the same logs twice.
+function updateLogsResumePosition(lastEventId) {
+	if (!lastEventId) {
+		return;
+	}
+	const url = new URL(logsElement.getAttribute("sse-connect"), window.location.href);
+	url.searchParams.set("since", lastEventId);
+	logsElement.setAttribute("sse-connect", url.pathname + url.search);
+}
+
+// Progress is only sent for commands that pull or build docker images: an empty object
+// means that there is no progress to display.
+const progressElement = document.getElementById("tutor-progress");
+function onProgressChange(progress) {
+	if (!progressElement) {
+		return;
+	}
+	progressElement.hidden = !progress.layers_total;
+	if (!progress.layers_total) {
+		return;
+	}
+	const bar = progressElement.querySelector("progress");
+	bar.value = progress.bytes_total
+		? progress.bytes_done / progress.bytes_total
+		: progress.layers_done / progress.layers_total;
+	let label = `${progress.layers_done}/${progress.layers_total} layers`;
+	if (progress.bytes_total) {
+		label += ` (${formatBytes(progress.bytes_done)} / ${formatBytes(progress.bytes_total)})`;
+	}
+	progressElement.querySelector("span").textContent = label;
+}
+
+// Plugins are sent whenever they are modified by a command, before the command
+// status: the plugin page is then updated on command completion.
+function onPluginsChange(plugins) {
+	if (typeof pluginName !== "undefined") {
+		isPluginInstalled = plugins.installed.includes(pluginName);
+	}
+}
+
+function formatBytes(size) {
+	const units = ["B", "kB", "MB", "GB", "TB"];
+	let unit = 0;
+	while (size >= 1000 && unit < units.length - 1) {
+		size /= 1000;
+		unit += 1;
+	}
+	return `${size.toFixed(unit ? 1 : 0)}${units[unit]}`;
+}
 
+function onStatusChange(threadAlive) {
 	// This means a parallel command is executing
-	if (data.thread_alive) {
+	if (threadAlive) {
 		threadWasAlive = true;
 		// Check if we are on the same page on which the actual command was executed
 		// Each page defines its relevant commands that are monitored and that will trigger a display of the log window.
 		let shouldDisplayLogs = tutorCommandsToWatch.some(
-			(prefix) => prefix === "*" || data.command.startsWith(prefix)
+			(prefix) => prefix === "*" || currentCommand.startsWith(prefix)
 		);
 		if(shouldDisplayLogs) {
 			ShowCancelCommandButton();
@@ -69,7 +276,7 @@ htmx.on("htmx:sseBeforeMessage", function (evt) {
 	}
 
 	// A parallel command was running, and now it's completed
-	const parallelCommandCompleted = threadWasAlive && !data.thread_alive;
+	const parallelCommandCompleted = threadWasAlive && !threadAlive;
 	// TODO this is a very brittle way of checking that we are on a plugin page... Let's not use static variables.
 	const onPluginPage = typeof pluginName !== "undefined";
 	// Note that sequential commands are only executed on the plugins page
@@ -80,37 +287,32 @@ htmx.on("htmx:sseBeforeMessage", function (evt) {
 		// There are certain commands for which we do not show the toast message
 		// Only show the toast if it was set in the `setToastContent` function and if the command ran successfully
 		// TODO this is brittle because it relies on a hard-coded "Success!" string that is sent from the backend.
-		if (data.stdout.includes("Success!")) {
-			setToastContent(data.command);
+		if (lastStdout.includes("Success!")) {
+			setToastContent(currentCommand);
 			if (toastTitle.textContent.trim()) {
 				showLaunchSuccessfulToast();
 			}
 		}
 		if (onPluginPage) {
-			checkIfPluginInstalled(pluginName).then((isInstalled) => {
-				if (isInstalled) {
-					isPluginInstalled = true;
-				}
-				showPluginEnableDisableBar();
-				ShowRunCommandButton();
-			});
-		} else {
-			ShowRunCommandButton();
+			showPluginEnableDisableBar();
 		}
+		ShowRunCommandButton();
 	}
+}
 
+function scrollLogs(element) {
 	// Scrolling management
 	if (shouldAutoScroll) {
 		// Set flag so event listener knows we are scrolling programmatically
 		isScrollingProgrammatically = true;
-		evt.detail.elt.scrollTop = evt.detail.elt.scrollHeight;
+		element.scrollTop = element.scrollHeight;
 
 		// Reset the flag after a short delay
 		setTimeout(() => {
 			isScrollingProgrammatically = false;
 		}, 10);
 	}
-});
+}
 
 // TODO we removed all code in these functions, which was too extensive. We should now clean this up.
 function onCommandComplete() {
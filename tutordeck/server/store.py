@@ -0,0 +1,149 @@
+import os
+import re
+import threading
+import typing as t
+
+import tutor.plugins.indexes
+from markdown import markdown
+from tutor.plugins.indexes import IndexEntry
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Split text in lower-case alphanumeric tokens.
+    """
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+class SearchIndex:
+    """
+    Inverted index of plugin store entries.
+
+    Entries are indexed by the tokens of their name, description and author. A search
+    query matches an entry when each query token is part of one of the entry tokens
+    (e.g: "edx" matches "openedx"). Thus, entries that contain the query, as searched by
+    Tutor, always match.
+    """
+
+    # Maximum number of cached token lookups
+    MAX_CACHED_TOKENS = 1024
+
+    def __init__(self, entries: list[IndexEntry]) -> None:
+        self.entries = entries
+        self._postings: dict[str, set[int]] = {}
+        for position, entry in enumerate(entries):
+            for token in tokenize(
+                " ".join([entry.name, entry.description, entry.author])
+            ):
+                self._postings.setdefault(token, set()).add(position)
+        self._tokens = list(self._postings)
+        self._token_cache: dict[str, frozenset[int]] = {}
+
+    def search(self, query: str) -> list[IndexEntry]:
+        """
+        Return matching entries, in index order. All entries match an empty query.
+        """
+        positions: t.Optional[frozenset[int]] = None
+        for token in tokenize(query):
+            matches = self._token_matches(token)
+            positions = matches if positions is None else positions & matches
+            if not positions:
+                return []
+        if positions is None:
+            return list(self.entries)
+        return [self.entries[position] for position in sorted(positions)]
+
+    def _token_matches(self, part: str) -> frozenset[int]:
+        """
+        Positions of entries that have a token that contains the query token.
+        """
+        if (matches := self._token_cache.get(part)) is not None:
+            return matches
+        positions: set[int] = set()
+        for token in self._tokens:
+            if part in token:
+                positions |= self._postings[token]
+        if len(self._token_cache) >= self.MAX_CACHED_TOKENS:
+            self._token_cache.clear()
+        matches = self._token_cache[part] = frozenset(positions)
+        return matches
+
+
+class StoreSnapshot:
+    """
+    Immutable view of the plugin store, as it was loaded from the index cache file.
+
+    Rendered descriptions are memoized, and discarded along with the snapshot when the
+    store is reloaded.
+    """
+
+    def __init__(self, stamp: tuple[str, int, int], entries: list[IndexEntry]) -> None:
+        self.stamp = stamp
+        self.entries = entries
+        self.by_name = {entry.name: entry for entry in entries}
+        self.search_index = SearchIndex(entries)
+        self._descriptions: dict[str, str] = {}
+
+    def description_html(self, entry: IndexEntry) -> str:
+        """
+        Return the description of an entry, rendered from markdown to HTML.
+        """
+        if (html := self._descriptions.get(entry.name)) is None:
+            html = self._descriptions[entry.name] = markdown(entry.description)
+        return html
+
+
+class PluginStore:
+    """
+    Process-wide snapshot of the plugin store, which is reloaded whenever the plugin
+    index cache file is modified.
+
+    Snapshots are never modified: they are replaced by new ones, such that concurrent
+    readers always get a consistent view of the store.
+    """
+
+    SNAPSHOT: t.Optional[StoreSnapshot] = None
+    LOCK = threading.Lock()
+
+    @classmethod
+    def snapshot(cls) -> StoreSnapshot:
+        """
+        Return the current snapshot. The store is empty until the index cache file
+        was downloaded.
+        """
+        snapshot = cls.SNAPSHOT
+        if snapshot is None or snapshot.stamp != cls.cache_stamp():
+            snapshot = cls.refresh()
+        return snapshot
+
+    @classmethod
+    def refresh(cls) -> StoreSnapshot:
+        """
+        Reload the store from the index cache file. Call this after the index cache was
+        updated.
+        """
+        with cls.LOCK:
+            stamp = cls.cache_stamp()
+            # Tutor caches the index content, but only clears the cache when
+            # plugins are loaded/unloaded.
+            tutor.plugins.indexes.load_cache.cache_clear()  # type: ignore[attr-defined]
+            try:
+                entries = list(tutor.plugins.indexes.iter_cache_entries())
+            except tutor.plugins.indexes.CacheNotFound:
+                entries = []
+            snapshot = StoreSnapshot(stamp, entries)
+            cls.SNAPSHOT = snapshot
+        return snapshot
+
+    @staticmethod
+    def cache_stamp() -> tuple[str, int, int]:
+        """
+        Identify the current version of the index cache file, by path, modification
+        time and size.
+        """
+        path = tutor.plugins.indexes.Indexes.CACHE_PATH
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return (path, 0, 0)
+        return (path, stat.st_mtime_ns, stat.st_size)
@@ -0,0 +1,193 @@
+import asyncio
+import os
+import signal
+import threading
+import time
+import typing as t
+from asyncio.subprocess import Process
+
+from . import constants
+
+# Child processes are stopped along with their own children on POSIX platforms only
+HAS_PROCESS_GROUPS = hasattr(os, "killpg")
+
+
+class ProcessExit(t.NamedTuple):
+    """
+    Structured report of a child process exit.
+    """
+
+    command: list[str]
+    # Exit code, or negative signal number when the process was killed by a signal
+    returncode: int
+    # True if the process was stopped on request
+    stopped: bool
+    duration: float
+
+    def to_dict(self) -> dict[str, t.Any]:
+        return {
+            "command": self.command,
+            "returncode": self.returncode,
+            "stopped": self.stopped,
+            "duration": self.duration,
+        }
+
+
+class SupervisedProcess:
+    """
+    Child process that runs in its own process group, and whose output is read by the
+    supervisor event loop.
+
+    Both stop requests and process exit are handled as soon as they happen: there is no
+    polling involved.
+    """
+
+    def __init__(self, command: list[str], on_output: t.Callable[[bytes], None]):
+        self.command = command
+        self.on_output = on_output
+        self._stopping = False
+        self._stop_event: t.Optional[asyncio.Event] = None
+
+    def stop(self) -> None:
+        """
+        Request the process to stop. This may be called from any thread, even before the
+        process was started.
+        """
+        Supervisor.loop().call_soon_threadsafe(self._request_stop)
+
+    def _request_stop(self) -> None:
+        self._stopping = True
+        if self._stop_event:
+            self._stop_event.set()
+
+    def run(self) -> ProcessExit:
+        """
+        Start the process and block the current thread until it exits. Must not be
+        called from the supervisor event loop.
+        """
+        return asyncio.run_coroutine_threadsafe(
+            self._supervise(), Supervisor.loop()
+        ).result()
+
+    async def _supervise(self) -> ProcessExit:
+        start = time.monotonic()
+        self._stop_event = asyncio.Event()
+        if self._stopping:
+            self._stop_event.set()
+        process = await asyncio.create_subprocess_exec(
+            *self.command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            start_new_session=HAS_PROCESS_GROUPS,
+        )
+        reader = asyncio.create_task(self._forward_output(process))
+        exited = asyncio.create_task(self._wait_for_exit(process))
+        stop_requested = asyncio.create_task(self._stop_event.wait())
+        try:
+            await asyncio.wait(
+                [exited, stop_requested], return_when=asyncio.FIRST_COMPLETED
+            )
+            stopped = not exited.done()
+            if stopped:
+                await self._terminate(process)
+            # Child processes might keep the pipe open after the process exited: don't
+            # wait forever for them, and stop them before giving up on the output.
+            timeout = (
+                constants.SHORT_SLEEP_SECONDS
+                if stopped
+                else constants.PROCESS_TERMINATE_TIMEOUT_SECONDS
+            )
+            if not await self._wait_for_output(reader, timeout):
+                await self._terminate(process)
+                if not await self._wait_for_output(
+                    reader, constants.SHORT_SLEEP_SECONDS
+                ):
+                    reader.cancel()
+        finally:
+            stop_requested.cancel()
+            if process.returncode is None:
+                await self._terminate(process)
+        return ProcessExit(
+            command=self.command,
+            returncode=t.cast(int, process.returncode),
+            stopped=stopped,
+            duration=time.monotonic() - start,
+        )
+
+    async def _forward_output(self, process: Process) -> None:
+        if process.stdout is None:
+            return
+        while content := await process.stdout.read(constants.LOG_READ_CHUNK_BYTES):
+            self.on_output(content)
+
+    @staticmethod
+    async def _wait_for_exit(process: Process) -> None:
+        """
+        Wait until the process exits. Unlike `Process.wait`, this does not wait until
+        the output pipe was closed by all child processes.
+        """
+        while process.returncode is None:
+            await asyncio.sleep(constants.SHORT_SLEEP_SECONDS)
+
+    @staticmethod
+    async def _wait_for_output(reader: asyncio.Task[None], timeout: float) -> bool:
+        """
+        Wait until all output was forwarded. Return False on timeout.
+        """
+        try:
+            await asyncio.wait_for(asyncio.shield(reader), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    @staticmethod
+    async def _terminate(process: Process) -> None:
+        """
+        Terminate the process group, then kill it if it does not exit in time. Where
+        process groups are not available, only the process itself is stopped.
+        """
+        for force in (False, True):
+            try:
+                if HAS_PROCESS_GROUPS:
+                    os.killpg(process.pid, signal.SIGKILL if force else signal.SIGTERM)
+                elif force:
+                    process.kill()
+                else:
+                    process.terminate()
+            except (ProcessLookupError, PermissionError):
+                # Process group no longer exists
+                pass
+            try:
+                await asyncio.wait_for(
+                    SupervisedProcess._wait_for_exit(process),
+                    constants.PROCESS_TERMINATE_TIMEOUT_SECONDS,
+                )
+                return
+            except asyncio.TimeoutError:
+                continue
+        await SupervisedProcess._wait_for_exit(process)
+
+
+class Supervisor:
+    """
+    Event loop, running in a dedicated thread, that supervises all child processes of
+    Tutor commands.
+    """
+
+    LOOP: t.Optional[asyncio.AbstractEventLoop] = None
+    LOCK = threading.Lock()
+
+    @classmethod
+    def loop(cls) -> asyncio.AbstractEventLoop:
+        """
+        Return the supervisor event loop, which is started on first access.
+        """
+        with cls.LOCK:
+            if cls.LOOP is None:
+                cls.LOOP = asyncio.new_event_loop()
+                threading.Thread(
+                    target=cls.LOOP.run_forever,
+                    name="tutor-deck-supervisor",
+                    daemon=True,
+                ).start()
+            return cls.LOOP
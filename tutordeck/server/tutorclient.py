@@ -1,28 +1,48 @@
 import asyncio
+import codecs
+import concurrent.futures
 import contextlib
+import contextvars
+import functools
+import importlib
 import logging
 import os
+import re
 import shlex
-import subprocess
-import tempfile
 import threading
+import time
 import typing as t
+import uuid
+from copy import deepcopy
 
-import aiofiles
 import click
-import click_repl
+import importlib_metadata
 import tutor.commands.cli
 import tutor.config
 import tutor.env
+import tutor.plugins
+import tutor.plugins.base
 import tutor.plugins.indexes
+import tutor.plugins.v1
 import tutor.utils
-from prompt_toolkit.document import Document
-from quart import Quart
 from tutor import fmt, hooks
+from tutor.commands.context import Context
 from tutor.exceptions import TutorError
 from tutor.types import Config
 
-from . import constants
+from . import (
+    completion,
+    constants,
+    coordination,
+    history,
+    locks,
+    logs,
+    logstore,
+    progress,
+    store,
+    supervisor,
+    worker,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -30,11 +50,22 @@ logger = logging.getLogger(__name__)
 class Project:
     """
     Provide access to the current Tutor project root and configuration.
+
+    Configuration is expensive to load, because all default values need to be
+    rendered. Thus, it is cached and reloaded only when config.yml is modified on disk,
+    or when the list of loaded plugins changes.
     """
 
     # Project root
     ROOT: str = ""
 
+    # Loaded configuration, indexed by (root, kind). Each value is a (key, config)
+    # tuple, where the key identifies the state of config.yml and of the plugins.
+    CONFIG_CACHE: dict[tuple[str, str], tuple[t.Hashable, Config]] = {}
+    CONFIG_CACHE_LOCK = threading.Lock()
+    CONFIG_CACHE_HITS: int = 0
+    CONFIG_CACHE_MISSES: int = 0
+
     @classmethod
     def connect(cls, root: str) -> None:
         """
@@ -44,49 +75,159 @@ class Project:
 
     @classmethod
     def get_config(cls) -> Config:
-        # TODO cache?
-        return tutor.config.load_full(cls.ROOT)
+        """
+        Return the full configuration, with user, base and default values.
+        """
+        return cls._get_cached_config("full", tutor.config.load_full)
 
     @classmethod
     def get_user_config(cls) -> Config:
         """
-        TODO load config dynamically from root anytime it is changed on disk? Maybe take the chance to clear sys.modules cache on reload?
+        Return the configuration that was saved by the user in config.yml.
         """
-        return tutor.config.get_user(cls.ROOT)
+        return cls._get_cached_config("user", tutor.config.get_user)
+
+    @classmethod
+    def clear_config_cache(cls) -> None:
+        """
+        Force configuration reload on next access. This should be called whenever the
+        configuration is modified.
+        """
+        with cls.CONFIG_CACHE_LOCK:
+            cls.CONFIG_CACHE.clear()
+
+    @classmethod
+    def config_cache_info(cls) -> dict[str, int]:
+        """
+        Cache statistics, for monitoring purposes.
+        """
+        return {
+            "hits": cls.CONFIG_CACHE_HITS,
+            "misses": cls.CONFIG_CACHE_MISSES,
+            "size": len(cls.CONFIG_CACHE),
+        }
+
+    @classmethod
+    def _get_cached_config(cls, kind: str, loader: t.Callable[[str], Config]) -> Config:
+        """
+        Load configuration from cache, or with the loader function on cache miss.
+
+        Callers are free to modify the returned configuration, as we always return a
+        copy of the cached value.
+        """
+        cache_key = cls._config_cache_key()
+        with cls.CONFIG_CACHE_LOCK:
+            cached = cls.CONFIG_CACHE.get((cls.ROOT, kind))
+            if cached is not None and cached[0] == cache_key:
+                cls.CONFIG_CACHE_HITS += 1
+                return deepcopy(cached[1])
+            cls.CONFIG_CACHE_MISSES += 1
+            config = loader(cls.ROOT)
+            cls.CONFIG_CACHE[(cls.ROOT, kind)] = (cache_key, config)
+            return deepcopy(config)
+
+    @classmethod
+    def config_generation(cls) -> t.Hashable:
+        """
+        Identify the current state of the configuration, such that values that are
+        computed from the configuration can be cached.
+        """
+        return cls._config_cache_key()
+
+    @classmethod
+    def _config_cache_key(cls) -> t.Hashable:
+        """
+        The cached configuration is invalidated whenever config.yml is modified or
+        replaced, or when plugins are loaded/unloaded.
+        """
+        try:
+            stat = os.stat(tutor.config.config_path(cls.ROOT))
+            file_key: tuple[int, ...] = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            file_key = ()
+        return (file_key, tuple(hooks.Filters.PLUGINS_LOADED.iterate()))
 
 
 class Cli:
     """
     Run Tutor commands and capture the output in a file.
 
-    Output must be a file because subprocess.Popen requires stdout.fileno() to be
-    available. We store logs in temporary files.
+    Logs are persisted by the log store. All output is also published to an in-memory
+    log broker, such that subscribers are notified whenever new content is available.
 
-    Tutor commands are not meant to be run in parallel. Thus, there must be only one
-    instance running at any time: calling functions are responsible for calling
-    CliPool instead of this class.
+    Tutor commands that modify the same resources are not meant to be run in parallel.
+    Thus, calling functions are responsible for scheduling commands with the CliPool
+    instead of running this class directly.
     """
 
+    # Runner of the command that is executed in the current context
+    CURRENT: contextvars.ContextVar[t.Optional["Cli"]] = contextvars.ContextVar(
+        "tutor_deck_cli", default=None
+    )
+    # Tutor functions that were replaced by dispatchers, indexed by (module, name)
+    ORIGINAL_OBJECTS: dict[tuple[t.Any, str], t.Callable[..., t.Any]] = {}
+    DISPATCHERS_LOCK = threading.Lock()
+
     def __init__(self, args: list[str]) -> None:
         """
         Each instance can be interrupted from other threads via the stop flag.
         """
         self.args = args
-        self.log_file = tempfile.NamedTemporaryFile(
-            "ab", prefix="tutor-deck-", suffix=".log"
-        )
+        self.id = uuid.uuid4().hex
+        self.log_writer = logstore.LogStore.create(self.id)
         self._stop_flag = threading.Event()
+        self._write_lock = threading.Lock()
+        self.logs = logs.LogBroker(functools.partial(logstore.LogStore.read, self.id))
+        # Exit code of the command, once it has completed
+        self.exit_code: t.Optional[int] = None
+        # Child processes that are currently running, and reports of those that exited
+        self._processes: list[supervisor.SupervisedProcess] = []
+        self._processes_lock = threading.Lock()
+        self.process_exits: list[supervisor.ProcessExit] = []
+        # Progress of docker pulls and builds, which is not written to the logs
+        self.progress = progress.ProgressTracker()
+        self.log_to_file(f"$ {self.command}\n")
 
     def log_to_file(self, content: str) -> None:
-        with open(self.log_path, mode="ab") as f:
-            f.write(content.encode())
+        self.log_bytes(content.encode())
+
+    def log_bytes(self, content: bytes) -> None:
+        """
+        Write content to the log file and notify subscribers.
+
+        Logs may be written concurrently by the command itself and by the threads that
+        read subprocess output.
+        """
+        if not content:
+            return
+        with self._write_lock:
+            self.log_writer.write(content)
+            self.logs.publish(content)
+
+    def close_logs(self, content: str = "") -> None:
+        """
+        Write the final log content and notify subscribers that the command has
+        completed.
+        """
+        with self._write_lock:
+            self.log_writer.write(content.encode())
+            self.log_writer.close()
+            self.logs.close(content.encode())
+        logstore.LogStore.release(self.id)
+
+    @property
+    def is_running(self) -> bool:
+        """
+        Return True until the command has completed and all logs were written.
+        """
+        return not self.logs.closed
 
     @property
     def log_path(self) -> str:
         """
-        Path to the log file
+        Directory where log segments are stored
         """
-        return self.log_file.name
+        return self.log_writer.directory
 
     @property
     def command(self) -> str:
@@ -104,6 +245,7 @@ class Cli:
         logger.info("Running command: %s (logs: %s)", self.command, self.log_path)
 
         # Override execute function
+        final_message = ""
         with self.patch_objects():
             try:
                 # Call tutor command
@@ -112,223 +254,849 @@ class Cli:
             except TutorError as e:
                 # This happens for incorrect commands and cancellation
                 self.log_to_file(e.args[0])
-                self.log_to_file("\nCancelled!\n")
-            except SystemExit:
+                final_message = "\nCancelled!\n"
+                self.exit_code = 1
+            except SystemExit as e:
+                if e.code is None or isinstance(e.code, int):
+                    self.exit_code = e.code or 0
+                else:
+                    self.exit_code = 1
                 # TODO Is there a better way to notify command completion??? The
                 # frontend relies on this hard-coded string to detect launch completion.
-                self.log_to_file("\nSuccess!")
+                final_message = "\nSuccess!" if self.exit_code == 0 else "\nFailed!\n"
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                # Unexpected errors would otherwise be lost in the executor thread
+                logger.exception("Command failed: %s", self.command)
+                self.log_to_file(f"Error: {e}\n")
+                final_message = "\nFailed!\n"
+                self.exit_code = 1
+            finally:
+                try:
+                    # Update state before notifying subscribers of command completion
+                    on_command_completed(self.args)
+                finally:
+                    self.close_logs(final_message)
 
     def stop(self) -> None:
         """
-        Sets the stop flag, which is monitored by all subprocess.Popen commands.
+        Sets the stop flag and stop all running child processes.
         """
         logger.info("Stopping Tutor command: %s...", self.command)
         self._stop_flag.set()
+        with self._processes_lock:
+            for process in self._processes:
+                process.stop()
 
-    async def iter_logs(self) -> t.AsyncGenerator[str, None]:
+    async def iter_logs(
+        self, offset: int = 0, tail: int = 0
+    ) -> t.AsyncGenerator[logs.LogChunk, None]:
         """
-        Async stream content from file.
-        The first item is the log file path. Second item is the running command.
+        Async stream log content until the command completes, starting from the byte
+        offset. When tail is positive, stream only the last `tail` bytes, starting from
+        the next full line.
 
-        This will handle gracefully file deletion. Note however that if the file is
-        truncated, all contents added to the beginning until the current position will be
-        missed.
+        Subscribers are woken up by the log broker whenever new content is written, so
+        that waiting for new content is free. Content is decoded incrementally, because
+        multi-byte characters might be split across chunks.
+
+        Line numbers are tracked along the way, such that clients can fetch earlier
+        lines (see `LogStore.read_lines`). The last chunk, which might be empty, is
+        yielded once the logs were closed, such that clients are notified that the
+        command has completed.
         """
-        yield f"$ {self.command}\n"
-        async with aiofiles.open(self.log_path, "rb") as f:
-            # Note that file reading needs to happen from the file path, because it maye
-            # be done from a separate thread, where the file object is not available.
-            while True:
-                content = await f.read()
-                if content:
-                    yield content.decode()
-                else:
-                    await asyncio.sleep(constants.SHORT_SLEEP_SECONDS)
+        skip_partial_line = False
+        if tail > 0 and self.logs.end_offset - tail > offset:
+            offset = self.logs.end_offset - tail
+            skip_partial_line = True
+        line = (
+            await asyncio.to_thread(logstore.LogStore.line_number, self.id, offset)
+            if offset > 0
+            else 0
+        )
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        async for content in self.logs.iter_chunks(offset):
+            offset += len(content)
+            if skip_partial_line:
+                if (newline := content.find(b"\n")) < 0:
+                    continue
+                content = content[newline + 1 :]
+                skip_partial_line = False
+                line += 1
+            if text := decoder.decode(content):
+                # Bytes that were not decoded yet will be sent with the next chunk
+                yield logs.LogChunk(
+                    self.id, text, offset - len(decoder.getstate()[0]), line
+                )
+                line += text.count("\n")
+        yield logs.LogChunk(self.id, decoder.decode(b"", final=True), offset, line)
 
     # Mocking functions to override tutor functions that write to stdout
     @contextlib.contextmanager
     def patch_objects(self) -> t.Iterator[None]:
-        refs = [
-            (tutor.utils, "execute", self._mock_execute),
-            (fmt.click, "echo", self._mock_click_echo),
-            (fmt.click, "style", self._mock_click_style),
-        ]
-        old_objects = []
-        for module, object_name, new_object in refs:
-            # backup old object
-            old_objects.append((module, object_name, getattr(module, object_name)))
-            # override object
-            setattr(module, object_name, new_object)
+        """
+        Redirect the output of tutor functions to this runner, in the current context
+        only.
+
+        The tutor functions are permanently replaced by dispatchers, which call the
+        mocking functions of the runner that is bound to the current thread or asyncio
+        task, and the original functions everywhere else. Thus, concurrent commands and
+        requests never write to each other's logs.
+
+        Note that threads that are started by the command itself do not inherit the
+        context, so their output is not captured.
+        """
+        self.install_dispatchers()
+        token = self.CURRENT.set(self)
         try:
             yield None
         finally:
-            # restore old objects
-            for module, object_name, old_object in old_objects:
-                setattr(module, object_name, old_object)
+            self.CURRENT.reset(token)
 
-    def _mock_click_echo(self, text: str, **_kwargs: t.Any) -> None:
+    @classmethod
+    def install_dispatchers(cls) -> None:
         """
-        Mock click.echo to write to log file
+        Replace tutor functions by dispatchers. This is a no-op after the first call.
         """
-        self.log_to_file(f"{text}\n")
+        with cls.DISPATCHERS_LOCK:
+            if cls.ORIGINAL_OBJECTS:
+                return
+            for module, object_name, mock_name in [
+                (tutor.utils, "execute", "_mock_execute"),
+                (fmt.click, "echo", "_mock_click_echo"),
+            ]:
+                original = getattr(module, object_name)
+                cls.ORIGINAL_OBJECTS[(module, object_name)] = original
+                setattr(module, object_name, cls._make_dispatcher(original, mock_name))
 
-    def _mock_click_style(self, text: str, **_kwargs: t.Any) -> str:
-        """
-        Mock click.style to strip ANSI colors
+    @classmethod
+    def _make_dispatcher(
+        cls, original: t.Callable[..., t.Any], mock_name: str
+    ) -> t.Callable[..., t.Any]:
+        @functools.wraps(original)
+        def dispatcher(*args: t.Any, **kwargs: t.Any) -> t.Any:
+            if (cli := cls.CURRENT.get()) is None:
+                return original(*args, **kwargs)
+            return getattr(cli, mock_name)(*args, **kwargs)
+
+        return dispatcher
 
-        TODO convert to HTML color codes?
+    def _mock_click_echo(
+        self, message: t.Any = None, *_args: t.Any, nl: bool = True, **_kwargs: t.Any
+    ) -> None:
+        """
+        Mock click.echo to write to log file
         """
-        return text
+        if isinstance(message, bytes):
+            message = message.decode(errors="replace")
+        text = "" if message is None else str(message)
+        self.log_to_file(f"{text}\n" if nl else text)
 
     def _mock_execute(self, *command: str) -> int:
         """
         Mock tutor.utils.execute.
+
+        Child processes are supervised by the supervisor event loop, which forwards
+        their output to the logs, and reacts to process exit and stop requests
+        immediately. Progress updates are removed from the output.
         """
         command_string = shlex.join(command)
-        with subprocess.Popen(
-            command, stdout=self.log_file, stderr=self.log_file
-        ) as popen:
-            while popen.returncode is None:
-                try:
-                    popen.wait(timeout=0.5)
-                except subprocess.TimeoutExpired as e:
-                    # Check every now and then whether we should stop
-                    if self._stop_flag.is_set():
-                        popen.kill()
-                        popen.wait()
-                        raise TutorError(
-                            f"Stopping child command: {command_string}"
-                        ) from e
-                except Exception as e:
-                    popen.kill()
-                    popen.wait()
-                    raise TutorError(f"Command failed: {command_string}") from e
-
-            if popen.returncode > 0:
-                raise TutorError(
-                    f"Command failed with status {popen.returncode}: {command_string}"
-                )
-            return popen.returncode
+        output = progress.ProgressFilter(self.progress)
+        process = supervisor.SupervisedProcess(
+            list(command), lambda content: self.log_bytes(output.feed(content))
+        )
+        with self._processes_lock:
+            self._processes.append(process)
+        try:
+            if self._stop_flag.is_set():
+                raise TutorError(f"Stopping child command: {command_string}")
+            try:
+                process_exit = process.run()
+            except OSError as e:
+                raise TutorError(f"Command failed: {command_string}: {e}") from e
+        finally:
+            with self._processes_lock:
+                self._processes.remove(process)
+            self.log_bytes(output.flush())
+        self.process_exits.append(process_exit)
+        if process_exit.stopped:
+            raise TutorError(f"Stopping child command: {command_string}")
+        if process_exit.returncode > 0:
+            raise TutorError(
+                f"Command failed with status {process_exit.returncode}: {command_string}"
+            )
+        return process_exit.returncode
+
+
+class WorkerCli(Cli):
+    """
+    Run Tutor commands in separate worker processes (see the worker module), such that
+    they do not modify the state of the server process, and can be reliably killed.
+
+    The server state is synchronized after every command.
+    """
+
+    def __init__(self, args: list[str]) -> None:
+        super().__init__(args)
+        self._worker: t.Optional[worker.Worker] = None
+        self._worker_lock = threading.Lock()
+
+    def run(self) -> None:
+        logger.info(
+            "Running command in worker process: %s (logs: %s)",
+            self.command,
+            self.log_path,
+        )
+        final_message = ""
+        command_worker = worker.WorkerPool.acquire()
+        with self._worker_lock:
+            self._worker = command_worker
+        reader = threading.Thread(
+            target=self._forward_worker_output, args=(command_worker,), daemon=True
+        )
+        reader.start()
+        try:
+            if self._stop_flag.is_set():
+                raise EOFError("Command was stopped before it started")
+            self.exit_code, error = command_worker.run(Project.ROOT, self.args)
+            if error:
+                # Same as TutorError in the server process
+                self.log_to_file(error)
+                final_message = "\nCancelled!\n"
+            else:
+                final_message = "\nSuccess!" if self.exit_code == 0 else "\nFailed!\n"
+        except (EOFError, OSError):
+            self.exit_code = 1
+            if self._stop_flag.is_set():
+                final_message = "\nCancelled!\n"
+            else:
+                final_message = "\nWorker process exited unexpectedly\nFailed!\n"
+        finally:
+            command_worker.process.join(timeout=constants.WORKER_EXIT_TIMEOUT_SECONDS)
+            reader.join(timeout=constants.WORKER_EXIT_TIMEOUT_SECONDS)
+            # Child processes might keep the pipe open: kill them if they are not done
+            command_worker.close(close_output=False)
+            reader.join(timeout=constants.WORKER_EXIT_TIMEOUT_SECONDS)
+            if reader.is_alive():
+                # Processes that left the process group still hold the pipe open
+                logger.warning("Command output was not fully read: %s", self.command)
+            try:
+                self.sync_server_state()
+                on_command_completed(self.args)
+            finally:
+                self.close_logs(final_message)
+
+    def stop(self) -> None:
+        """
+        Terminate the worker and all its child processes, then kill them if they are
+        still running after some time.
+        """
+        super().stop()
+        with self._worker_lock:
+            command_worker = self._worker
+        if command_worker is None:
+            return
+        command_worker.kill()
+        timer = threading.Timer(
+            constants.WORKER_EXIT_TIMEOUT_SECONDS,
+            command_worker.kill,
+            kwargs={"force": True},
+        )
+        timer.daemon = True
+        timer.start()
+
+    def _forward_worker_output(self, command_worker: worker.Worker) -> None:
+        """
+        Forward the worker output to the logs. The output pipe is closed once all
+        processes that write to it have exited.
+        """
+        output = progress.ProgressFilter(self.progress)
+        try:
+            for content in command_worker.iter_output():
+                self.log_bytes(output.feed(content))
+            self.log_bytes(output.flush())
+        finally:
+            command_worker.output.close()
+
+    def sync_server_state(self) -> None:
+        """
+        Commands that were run in a worker did not modify the plugins that are loaded
+        in the server process. Also, the spare worker has stale plugins after plugin
+        packages were installed or removed.
+        """
+        path = command_path(self.args)
+        if path[:1] != ["plugins"] or len(path) < 2:
+            return
+        if path[1] in ("enable", "disable"):
+            sync_loaded_plugins()
+        elif path[1] in ("install", "uninstall", "upgrade"):
+            worker.WorkerPool.recycle()
+
+
+class RemoteCli(Cli):
+    """
+    Mirror of a command that is run by another process of a multi-worker server.
+
+    The command is not run by this process: its logs are read from the shared log
+    store as they are written, and published to the log broker, such that they are
+    streamed exactly like the logs of local commands. Stop requests are forwarded to
+    the process that runs the command.
+    """
+
+    def __init__(  # pylint: disable=super-init-not-called
+        self, job_id: str, args: list[str], log_path: str
+    ) -> None:
+        self.args = args
+        self.id = job_id
+        self._log_path = log_path
+        self.logs = logs.LogBroker(functools.partial(logstore.LogStore.read, self.id))
+        self.exit_code = None
+        self.process_exits = []
+        # Progress is not shared between processes
+        self.progress = progress.ProgressTracker()
+
+    @property
+    def log_path(self) -> str:
+        return self._log_path
+
+    def run(self) -> None:
+        raise RuntimeError(f"Command is run by another process: {self.command}")
+
+    def stop(self) -> None:
+        logger.info("Requesting stop of Tutor command: %s...", self.command)
+        history.History.request_stop(self.id)
+
+    def read_logs(self) -> None:
+        """
+        Publish the content that was written to the log store since the last call.
+        """
+        for content in logstore.LogStore.iter_chunks(self.id, self.logs.end_offset):
+            self.logs.publish(content)
+
+    def complete(
+        self, exit_code: t.Optional[int], processes: list[dict[str, t.Any]]
+    ) -> None:
+        """
+        Publish the last logs and mark the command as completed.
+        """
+        self.read_logs()
+        self.exit_code = exit_code
+        self.process_exits = [
+            supervisor.ProcessExit(**process_exit) for process_exit in processes
+        ]
+        self.logs.close()
+
+
+class Job:
+    """
+    Tutor command that is scheduled for execution by the CliPool.
+    """
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    def __init__(self, args: list[str], cli: t.Optional[Cli] = None) -> None:
+        self.cli = cli or (WorkerCli(args) if CliPool.USE_WORKERS else Cli(args))
+        self.id = self.cli.id
+        self.locks = locks.command_locks(command_path(args))
+        # Server process that runs the job
+        self.owner = os.getpid()
+        self.created_at = time.time()
+        self.started_at: t.Optional[float] = None
+        self.ended_at: t.Optional[float] = None
+        self.cancelled = False
+        # Execution of the job by the CliPool executor
+        self.future: t.Optional[concurrent.futures.Future[None]] = None
+        # Set once the job has completed and locks were released
+        self.done = threading.Event()
+
+    @classmethod
+    def from_record(cls, record: dict[str, t.Any]) -> "Job":
+        """
+        Mirror a job that is run by another server process, given its history record.
+        """
+        args = shlex.split(record["command"])[1:]
+        job = cls(args, RemoteCli(record["id"], args, record["log_path"]))
+        job.owner = record["owner"]
+        job.created_at = record["created_at"]
+        return job
+
+    @property
+    def command(self) -> str:
+        return self.cli.command
+
+    @property
+    def remote(self) -> bool:
+        return isinstance(self.cli, RemoteCli)
+
+    @property
+    def status(self) -> str:
+        """
+        The job is considered complete as soon as its logs are closed.
+        """
+        if self.cli.is_running:
+            return self.QUEUED if self.started_at is None else self.RUNNING
+        if self.cli.exit_code == 0:
+            return self.SUCCEEDED
+        if self.cancelled:
+            return self.CANCELLED
+        return self.FAILED
+
+    def to_dict(self) -> dict[str, t.Any]:
+        return {
+            "id": self.id,
+            "command": self.command,
+            "status": self.status,
+            "exit_code": self.cli.exit_code,
+            "processes": [
+                process_exit.to_dict() for process_exit in self.cli.process_exits
+            ],
+            "progress": self.cli.progress.to_dict(),
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "ended_at": self.ended_at,
+            "log_path": self.cli.log_path,
+            "owner": self.owner,
+        }
+
+    async def wait(self) -> None:
+        """
+        Wait until the job has completed.
+        """
+        await CliPool.JOBS_NOTIFIER.wait_for(self.done.is_set)
 
 
 class CliPool:
-    CLI_INSTANCE: t.Optional[Cli] = None
-    THREAD: t.Optional[threading.Thread] = None
+    """
+    Schedule Tutor commands for execution in a bounded pool of threads.
+
+    Each job requires locks on the resources that it accesses (see the locks module).
+    Jobs with compatible locks run concurrently, up to MAX_RUNNING_JOBS. Conflicting
+    jobs are queued, and started in submission order as soon as the jobs they conflict
+    with have completed. A queued job never starts before an earlier queued job it
+    conflicts with.
+
+    Commands never run in the event loop thread, such that streaming and other requests
+    are never blocked by a running command.
+
+    Jobs are recorded in the persistent history whenever they are submitted, started or
+    completed.
+
+    In a multi-worker server, jobs of other server processes are mirrored, such that
+    every process can stream, list and stop all jobs, and takes them into account for
+    scheduling (see `sync_remote_jobs`). Conflicting jobs of different processes are
+    also prevented from running at the same time by file locks.
+    """
+
+    # All jobs, indexed by ID, in submission order
+    JOBS: dict[str, Job] = {}
+    # Jobs waiting for locks, in submission order
+    QUEUE: list[Job] = []
+    # Running jobs, in start order
+    RUNNING: list[Job] = []
+    # Most recently started job
+    LATEST_JOB: t.Optional[Job] = None
+    LOCK = threading.Lock()
+    # Notify subscribers whenever a job is started or completed
+    JOBS_NOTIFIER = logs.Notifier()
+    EXECUTOR = concurrent.futures.ThreadPoolExecutor(
+        max_workers=constants.MAX_RUNNING_JOBS, thread_name_prefix="tutor-deck-job"
+    )
+    # Run commands in worker processes instead of the server process
+    USE_WORKERS: bool = False
 
     @classmethod
-    def run_sequential(cls, args: list[str]) -> None:
-        cls.stop()
-        cls.CLI_INSTANCE = Cli(args)
-        cls.CLI_INSTANCE.run()
+    def submit(cls, args: list[str]) -> Job:
+        """
+        Schedule a command for execution, and start it if possible.
+        """
+        job = Job(args)
+        with cls.LOCK:
+            cls.JOBS[job.id] = job
+            cls.QUEUE.append(job)
+            cls._forget_completed_jobs()
+            cls._schedule()
+            is_queued = job in cls.QUEUE
+        if is_queued:
+            job.cli.log_to_file("Waiting for other commands to complete...\n")
+            history.History.save_later(job.to_dict())
+        cls.JOBS_NOTIFIER.notify_all()
+        return job
 
     @classmethod
-    def run_parallel(cls, app: Quart, args: list[str]) -> None:
+    async def run_and_wait(
+        cls,
+        args: list[str],
+        timeout: float = constants.SEQUENTIAL_COMMAND_TIMEOUT_SECONDS,
+    ) -> Job:
         """
-        Run a command in a separate thread. This command automatically stops any running
-        command.
+        Run a command and wait until it has completed, without blocking the event loop.
+        Return the job, such that callers can check its status.
+
+        The timeout includes the time spent waiting for conflicting jobs. When it
+        expires, the job is stopped, and returned without waiting for completion.
         """
-        # Stop any running command
-        cls.stop()
+        job = cls.submit(args)
+        try:
+            await asyncio.wait_for(job.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Command timed out after %gs: %s", timeout, job.command)
+            job.cli.log_to_file(f"\nCommand timed out after {timeout:g}s\n")
+            cls.stop_job(job.id)
+        return job
 
-        # Start thread
-        cls.CLI_INSTANCE = Cli(args)
-        cls.THREAD = threading.Thread(target=cls.CLI_INSTANCE.run)
-        cls.THREAD.start()
+    @classmethod
+    def run_parallel(cls, args: list[str]) -> Job:
+        """
+        Run a command in the background. Running commands are no longer stopped: when
+        they conflict with the new command, it is queued instead.
+        """
+        return cls.submit(args)
 
-        # Watch for exit
-        app.add_background_task(cls.stop_on_exit, cls.CLI_INSTANCE, cls.THREAD)
+    @classmethod
+    def _schedule(cls) -> None:
+        """
+        Start all queued jobs whose locks are compatible with the running jobs and with
+        the jobs that were queued before them. Must be called while holding the lock.
+        """
+        held = [job.locks for job in cls.RUNNING]
+        for job in list(cls.QUEUE):
+            if len(cls.RUNNING) >= constants.MAX_RUNNING_JOBS:
+                break
+            if not any(locks.conflict(job.locks, other) for other in held):
+                cls.QUEUE.remove(job)
+                cls._start(job)
+            held.append(job.locks)
 
     @classmethod
-    def stop(cls) -> None:
+    def _start(cls, job: Job) -> None:
+        job.started_at = time.time()
+        cls.RUNNING.append(job)
+        cls.LATEST_JOB = job
+        history.History.save_later(job.to_dict())
+        job.future = cls.EXECUTOR.submit(cls._run, job)
+
+    @classmethod
+    def _run(cls, job: Job) -> None:
+        resource_locks = coordination.ResourceLocks(job.locks)
+        try:
+            if cls._wait_for_resource_locks(job, resource_locks):
+                job.cli.run()
+            else:
+                job.cli.close_logs("\nCancelled!\n")
+        finally:
+            resource_locks.release()
+            with cls.LOCK:
+                job.ended_at = time.time()
+                cls.RUNNING.remove(job)
+                cls._schedule()
+            history.History.save_later(job.to_dict())
+            job.done.set()
+            cls.JOBS_NOTIFIER.notify_all()
+
+    @classmethod
+    def _wait_for_resource_locks(
+        cls, job: Job, resource_locks: coordination.ResourceLocks
+    ) -> bool:
         """
-        Stop running instance.
+        Wait until conflicting jobs of other server processes have completed. Return
+        False if the job was cancelled in the meantime.
+        """
+        if resource_locks.acquire():
+            return True
+        job.cli.log_to_file("Waiting for commands of other server workers...\n")
+        while not job.cancelled:
+            time.sleep(constants.COORDINATION_POLL_INTERVAL_SECONDS)
+            if resource_locks.acquire():
+                job.started_at = time.time()
+                history.History.save_later(job.to_dict())
+                return True
+        return False
 
-        This is a no-op when there is no running thread, so it's safe to call any time.
+    @classmethod
+    def _forget_completed_jobs(cls) -> None:
+        """
+        Keep only the most recent completed jobs. Must be called while holding the lock.
         """
-        if cls.CLI_INSTANCE and cls.THREAD:
-            cls.stop_runner_thread(cls.CLI_INSTANCE, cls.THREAD)
+        completed = [job_id for job_id, job in cls.JOBS.items() if job.done.is_set()]
+        for job_id in completed[: -constants.JOBS_HISTORY_SIZE or None]:
+            cls.JOBS.pop(job_id)
+
+    @classmethod
+    def get_job(cls, job_id: str) -> t.Optional[Job]:
+        return cls.JOBS.get(job_id)
 
     @classmethod
-    def current_command(cls) -> str:
+    def list_jobs(cls) -> list[Job]:
+        with cls.LOCK:
+            return list(cls.JOBS.values())
+
+    @classmethod
+    def current_job(cls) -> t.Optional[Job]:
         """
-        Return the current or last command that was executed.
+        Return the most recently started job that is still running, or else the last
+        job that was started.
         """
-        if cls.CLI_INSTANCE is None:
-            raise RuntimeError("CLI_INSTANCE is not initialized.")
-        return cls.CLI_INSTANCE.command
+        with cls.LOCK:
+            return cls.RUNNING[-1] if cls.RUNNING else cls.LATEST_JOB
 
     @classmethod
-    def is_thread_alive(cls) -> bool:
+    def stop_job(cls, job_id: str) -> bool:
         """
-        Check if the thread is running.
+        Cancel a queued job, or set the stop flag of a running job. Return False if the
+        job does not exist or has already completed.
 
+        This does not wait for the job to complete.
         """
-        if cls.CLI_INSTANCE and cls.THREAD:
-            return cls.THREAD.is_alive()
-        return False
+        with cls.LOCK:
+            job = cls.JOBS.get(job_id)
+            if job is None or job.done.is_set():
+                return False
+            job.cancelled = True
+            is_queued = job in cls.QUEUE
+            if is_queued:
+                cls.QUEUE.remove(job)
+                job.ended_at = time.time()
+                # Later jobs might have been waiting for this one
+                cls._schedule()
+        if is_queued:
+            job.cli.close_logs("\nCancelled!\n")
+            history.History.save_later(job.to_dict())
+            job.done.set()
+            cls.JOBS_NOTIFIER.notify_all()
+        else:
+            job.cli.stop()
+        return True
+
+    @classmethod
+    def stop(cls) -> None:
+        """
+        Cancel all queued and running jobs, and wait for them to complete. This happens
+        for instance when the server is stopped or reloaded.
+
+        This is a no-op when there is no job, so it's safe to call any time.
+        """
+        for job in cls.list_jobs():
+            if not job.remote:
+                cls.stop_job(job.id)
+        concurrent.futures.wait(
+            [job.future for job in cls.list_jobs() if job.future is not None]
+        )
+        worker.WorkerPool.shutdown()
 
-    @staticmethod
-    def stop_runner_thread(tutor_cli_runner: Cli, thread: threading.Thread) -> None:
+    @classmethod
+    def sync_remote_jobs(cls, changed: bool) -> None:
         """
-        Set runner stop flag and wait for thread to complete.
+        Synchronize jobs with the other processes of a multi-worker server. This is
+        called periodically by the coordinator, with changed=True if the history was
+        modified by another process.
+
+        Logs of local jobs are flushed, such that other processes can read them, and
+        stop requests of other processes are applied to local jobs. Jobs of other
+        processes are mirrored (see `RemoteCli`), and their logs are published as soon
+        as they are written. Jobs of processes that no longer exist are marked as
+        interrupted.
         """
-        if thread.is_alive():
-            tutor_cli_runner.stop()
-            thread.join()
+        logstore.LogStore.flush()
+        owner = os.getpid()
+        records: dict[str, dict[str, t.Any]] = {}
+        if changed:
+            for job_id in history.History.pop_stop_requests(owner):
+                cls.stop_job(job_id)
+            for record in history.History.list_unfinished():
+                if record["owner"] != owner:
+                    records[record["id"]] = record
+            with cls.LOCK:
+                for job_id, record in records.items():
+                    if job_id not in cls.JOBS:
+                        cls.JOBS[job_id] = Job.from_record(record)
+                cls._forget_completed_jobs()
+        for job in cls.list_jobs():
+            if not job.remote or job.done.is_set():
+                continue
+            t.cast(RemoteCli, job.cli).read_logs()
+            if not history.is_alive(job.owner):
+                # The process was killed before the job completed
+                history.History.interrupt(job.owner)
+                cls._update_remote_job(job, history.History.get(job.id) or {})
+            elif changed:
+                record = records.get(job.id) or history.History.get(job.id) or {}
+                cls._update_remote_job(job, record)
 
     @classmethod
-    async def stop_on_exit(
-        cls, tutor_cli_runner: Cli, thread: threading.Thread
-    ) -> None:
+    def _update_remote_job(cls, job: Job, record: dict[str, t.Any]) -> None:
         """
-        This background task will stop the runner whenever the Quart app is
-        requested to stop/exit/shutdown. This happens for instance on dev reload.
+        Update the state of a mirrored job from its history record. An empty record
+        means that the job no longer exists in the history.
         """
-        try:
-            while thread.is_alive():
-                await asyncio.sleep(constants.SHORT_SLEEP_SECONDS)
-        finally:
-            cls.stop_runner_thread(tutor_cli_runner, thread)
+        if job.started_at is None and record.get("started_at") is not None:
+            with cls.LOCK:
+                job.started_at = record["started_at"]
+                cls.RUNNING.append(job)
+                cls.LATEST_JOB = job
+            cls.JOBS_NOTIFIER.notify_all()
+        status = record.get("status", history.INTERRUPTED)
+        if record.get("ended_at") is None and status != history.INTERRUPTED:
+            return
+        # Plugins must be discovered before subscribers are notified of completion
+        discover_installed_plugins(job.cli.args)
+        job.cancelled = status == Job.CANCELLED
+        t.cast(RemoteCli, job.cli).complete(
+            record.get("exit_code"), record.get("processes", [])
+        )
+        with cls.LOCK:
+            job.ended_at = record.get("ended_at") or time.time()
+            if job in cls.RUNNING:
+                cls.RUNNING.remove(job)
+                cls._schedule()
+        job.done.set()
+        cls.JOBS_NOTIFIER.notify_all()
 
     @classmethod
-    async def iter_logs(cls) -> t.AsyncGenerator[str, None]:
+    async def iter_logs(
+        cls, since: t.Optional[tuple[str, int]] = None, tail: int = 0
+    ) -> t.AsyncGenerator[logs.LogChunk, None]:
         """
-        Iterate indefinitely from any running instance. When an existing instance is
-        replaced by another one, previous logs are not deleted. New ones are simply
-        appended.
+        Iterate indefinitely on the logs of the current job (see `current_job`). When a
+        new job is started, we switch to it, and we switch back to the previous job if
+        it is still running once the new one has completed. Streaming of every job
+        resumes where it was left off.
+
+        Jobs that were already streamed are always streamed until their completion:
+        when such a job completes while another one is streamed, we switch back to it
+        until the end of its logs.
+
+        When the current job has completed, we wait until a new one is started.
+
+        Streaming may be resumed from a (job id, byte offset) position: when the current
+        job matches, only the content after the offset is streamed. Otherwise, if tail
+        is positive, only the last `tail` bytes of the current job are streamed.
         """
-        while cls.CLI_INSTANCE:
-            async for log in cls.CLI_INSTANCE.iter_logs():
-                yield log
+        offsets: dict[str, int] = {}
+        # Jobs whose logs were partially streamed
+        subscribed: dict[str, Job] = {}
+        if since:
+            offsets[since[0]] = since[1]
+            if since_job := cls.get_job(since[0]):
+                subscribed[since_job.id] = since_job
+        # Jobs that have completed, and whose logs were fully streamed
+        streamed: set[str] = set()
+
+        def next_job() -> t.Optional[Job]:
+            for subscribed_job in subscribed.values():
+                if subscribed_job.done.is_set():
+                    return subscribed_job
+            job = cls.current_job()
+            return job if job is not None and job.id not in streamed else None
+
+        while True:
+            await cls.JOBS_NOTIFIER.wait_for(lambda: next_job() is not None)
+            job = next_job()
+            if job is None:
+                continue
+            subscribed[job.id] = job
+            if job.id in offsets:
+                offset, job_tail = offsets[job.id], 0
+            else:
+                offset, job_tail = 0, tail
+            # Tail option only applies to the first job
+            tail = 0
+
+            chunks = job.cli.iter_logs(offset=offset, tail=job_tail)
+            switched = asyncio.ensure_future(
+                cls.JOBS_NOTIFIER.wait_for(lambda: next_job() is not job)
+            )
+            next_chunk: t.Optional[asyncio.Future[logs.LogChunk]] = None
+            try:
+                while True:
+                    next_chunk = asyncio.ensure_future(chunks.__anext__())
+                    await asyncio.wait(
+                        [next_chunk, switched], return_when=asyncio.FIRST_COMPLETED
+                    )
+                    if not next_chunk.done():
+                        # Another job was started or resumed: switch to it
+                        break
+                    try:
+                        chunk = next_chunk.result()
+                    except StopAsyncIteration:
+                        subscribed.pop(job.id)
+                        streamed.add(job.id)
+                        break
+                    offsets[job.id] = chunk.offset
+                    yield chunk
+            finally:
+                switched.cancel()
+                if next_chunk is not None and not next_chunk.done():
+                    # The log iterator cannot be closed while it is running
+                    next_chunk.cancel()
+                    with contextlib.suppress(asyncio.CancelledError):
+                        await next_chunk
+                await chunks.aclose()
 
 
 class Client:
+    # Incremented whenever plugins are installed, enabled or disabled
+    PLUGINS_GENERATION: int = 0
+    # Lists of plugins, indexed by name, along with the generation they were computed at
+    PLUGINS_CACHE: dict[str, tuple[int, list[str]]] = {}
+    # Completion engine, and the plugins generation it was built at
+    COMPLETION_ENGINE: t.Optional[completion.CompletionEngine] = None
+    COMPLETION_ENGINE_GENERATION: int = -1
+    COMPLETION_ENGINE_LOCK = threading.Lock()
+
     @classmethod
-    def plugin_in_store(cls, name: str) -> t.Optional[tutor.plugins.indexes.IndexEntry]:
-        for plugin in cls.plugins_in_store():
-            if plugin.name == name:
-                return plugin
-        return None
+    def store(cls) -> store.StoreSnapshot:
+        """
+        Return the current snapshot of the plugin store, which is empty until the
+        plugin index was downloaded: async views should call `ensure_store` first.
+        """
+        return store.PluginStore.snapshot()
 
     @classmethod
-    def plugins_in_store(cls) -> list[tutor.plugins.indexes.IndexEntry]:
+    async def ensure_store(cls) -> None:
+        """
+        Download the plugin index if necessary, without blocking the event loop. Async
+        views should call this before accessing the store.
+        """
         if not os.path.exists(tutor.plugins.indexes.Indexes.CACHE_PATH):
-            CliPool.run_sequential(["plugins", "update"])
-        return list(tutor.plugins.indexes.iter_cache_entries())
+            await CliPool.run_and_wait(["plugins", "update"])
 
     @classmethod
     def installed_plugins(cls) -> list[str]:
-        return sorted(set(hooks.Filters.PLUGINS_INSTALLED.iterate()))
+        return cls._get_cached_plugins(
+            "installed", lambda: sorted(set(hooks.Filters.PLUGINS_INSTALLED.iterate()))
+        )
 
     @classmethod
     def enabled_plugins(cls) -> list[str]:
-        return list(hooks.Filters.PLUGINS_LOADED.iterate())
+        return cls._get_cached_plugins(
+            "enabled", lambda: list(hooks.Filters.PLUGINS_LOADED.iterate())
+        )
 
     @classmethod
-    def plugins_matching_pattern(cls, pattern: str) -> list[str]:
-        return [
-            plugin.name for plugin in cls.plugins_in_store() if plugin.match(pattern)
-        ]
+    def _get_cached_plugins(
+        cls, name: str, compute: t.Callable[[], list[str]]
+    ) -> list[str]:
+        """
+        Plugin lists are computed on first access, and then cached until the plugins
+        generation changes.
+        """
+        generation = cls.PLUGINS_GENERATION
+        cached = cls.PLUGINS_CACHE.get(name)
+        if cached is None or cached[0] != generation:
+            cached = (generation, compute())
+            cls.PLUGINS_CACHE[name] = cached
+        return list(cached[1])
+
+    @classmethod
+    def bump_plugins_generation(cls) -> None:
+        """
+        Invalidate cached plugin lists. Call this whenever plugins are installed,
+        enabled or disabled.
+        """
+        cls.PLUGINS_GENERATION += 1
 
     @classmethod
     def plugin_config_unique(cls, name: str) -> Config:
@@ -362,18 +1130,177 @@ class Client:
     @classmethod
     def autocomplete(cls, partial_command: str) -> list[dict[str, str]]:
         """
-        Handle CLI command completion via click_repl.ClickCompleter
-        https://github.com/click-contrib/click-repl/blob/master/click_repl/_completer.py
-        """
-        cli = tutor.commands.cli.cli
-        ctx = click.Context(cli, info_name=cli.name, parent=None)
-        completer = click_repl.ClickCompleter(cli, ctx)
-        document = Document(partial_command, len(partial_command))
-        completions = list(completer.get_completions(document, None))
-        return [
-            {
-                "text": completion.text,
-                "display": completion.display,
-            }
-            for completion in completions
-        ]
+        Handle CLI command completion.
+        """
+        return cls.completion_engine().complete(partial_command)
+
+    @classmethod
+    def completion_engine(cls) -> completion.CompletionEngine:
+        """
+        Return the tree of Tutor commands, which is rebuilt whenever plugins are
+        modified, because they might add new commands. Engines are never modified once
+        built, so they can be used by concurrent threads, but only one thread builds
+        them at a time.
+        """
+        with cls.COMPLETION_ENGINE_LOCK:
+            # Plugins might be modified while the engine is built
+            generation = cls.PLUGINS_GENERATION
+            if (
+                cls.COMPLETION_ENGINE is None
+                or cls.COMPLETION_ENGINE_GENERATION != generation
+            ):
+                # Root context, as created by `tutor --root=...`
+                ctx = click.Context(
+                    tutor.commands.cli.cli,
+                    info_name="tutor",
+                    obj=Context(Project.ROOT),
+                )
+                ctx.params["root"] = Project.ROOT
+                cls.COMPLETION_ENGINE = completion.CompletionEngine(
+                    tutor.commands.cli.cli, ctx
+                )
+                cls.COMPLETION_ENGINE_GENERATION = generation
+            return cls.COMPLETION_ENGINE
+
+
+# Plugin subcommands that modify the list of installed or enabled plugins
+PLUGINS_STATE_SUBCOMMANDS = ("install", "uninstall", "upgrade", "enable", "disable")
+
+
+def on_command_completed(args: list[str]) -> None:
+    """
+    Refresh the server state that might have been modified by a Tutor command.
+    """
+    path = command_path(args)
+    command_locks = locks.command_locks(path)
+    if locks.EXCLUSIVE in (command_locks.get("config"), command_locks.get(locks.ALL)):
+        # The configuration might have been modified
+        coordination.Coordinator.bump("config")
+    if len(path) < 2 or path[0] != "plugins":
+        return
+    if path[1] == "update":
+        if os.path.exists(tutor.plugins.indexes.Indexes.CACHE_PATH):
+            store.PluginStore.refresh()
+    elif path[1] in PLUGINS_STATE_SUBCOMMANDS:
+        discover_installed_plugins(args)
+        Client.bump_plugins_generation()
+        coordination.Coordinator.bump("plugins")
+
+
+def discover_installed_plugins(args: list[str]) -> None:
+    """
+    Discover the plugins that were installed by a "tutor plugins install ..." command.
+
+    Tutor only discovers plugins on startup, by scanning the entry points of all
+    installed distributions. Instead, we only look up the distributions of the newly
+    installed plugins, and add them to the installed plugins.
+    """
+    path = command_path(args)
+    if path[:2] != ["plugins", "install"]:
+        return
+    installed = set(hooks.Filters.PLUGINS_INSTALLED.iterate())
+    # Distributions were installed by another process
+    importlib.invalidate_caches()
+    discovered = []
+    with hooks.Contexts.PLUGINS.enter():
+        for name in path[2:]:
+            if name in installed:
+                continue
+            if module_path := find_plugin_module(name):
+                tutor.plugins.v1.discover_module(module_path)
+                discovered.append(name)
+            elif entrypoint := find_plugin_entrypoint(name):
+                tutor.plugins.v1.discover_package(entrypoint)
+                discovered.append(name)
+    if discovered:
+        logger.info("Discovered installed plugins: %s", ", ".join(discovered))
+        Client.bump_plugins_generation()
+
+
+def plugin_install_source(name: str) -> str:
+    """
+    Return where a plugin is installed from: a plugin name from the plugin store, a
+    local file or a URL (see `tutor plugins install`).
+    """
+    if tutor.utils.is_url(name):
+        return name
+    if entry := store.PluginStore.snapshot().by_name.get(name):
+        src: str = hooks.Filters.PLUGIN_INDEX_ENTRY_TO_INSTALL.apply(entry.data)["src"]
+        return src.strip()
+    return ""
+
+
+def find_plugin_module(name: str) -> str:
+    """
+    Return the path of a single-file plugin that was copied to the plugins root, or an
+    empty string if the plugin is not a single-file plugin.
+    """
+    src = plugin_install_source(name)
+    if not src or not tutor.utils.is_url(src):
+        return ""
+    path = os.path.join(tutor.plugins.base.PLUGINS_ROOT, os.path.basename(src))
+    if not path.endswith(".py") and not path.endswith(".yml"):
+        path += ".py"
+    # Only python modules are v1 plugins
+    return path if path.endswith(".py") and os.path.exists(path) else ""
+
+
+def find_plugin_entrypoint(name: str) -> t.Optional[importlib_metadata.EntryPoint]:
+    """
+    Find the entry point of a plugin in the distribution that it was installed from.
+    All distributions are scanned only when the distribution cannot be found from the
+    pip requirement of the plugin, e.g: because it is a VCS URL.
+    """
+    entrypoints: t.Iterable[importlib_metadata.EntryPoint] = []
+    src = plugin_install_source(name) or name
+    # Distribution name of a PEP 508 requirement, which is not a URL
+    match = re.match(r"[A-Za-z0-9][A-Za-z0-9._-]*", src)
+    if match and not src[match.end() :].startswith(("://", "+")):
+        try:
+            distribution = importlib_metadata.distribution(match.group())
+        except importlib_metadata.PackageNotFoundError:
+            pass
+        else:
+            entrypoints = distribution.entry_points.select(
+                group="tutor.plugin.v1", name=name
+            )
+    for entrypoint in entrypoints or importlib_metadata.entry_points(
+        group="tutor.plugin.v1", name=name
+    ):
+        return entrypoint
+    return None
+
+
+def on_plugins_changed() -> None:
+    """
+    Synchronize the server state after plugins were modified by another server process.
+    """
+    sync_loaded_plugins()
+    if CliPool.USE_WORKERS:
+        worker.WorkerPool.recycle()
+
+
+def sync_loaded_plugins() -> None:
+    """
+    Load and unload plugins in the server process, such that loaded plugins match the
+    plugins that are enabled in the configuration.
+    """
+    config = tutor.config.load_minimal(Project.ROOT)
+    enabled = set(tutor.config.get_enabled_plugins(config))
+    loaded = set(tutor.plugins.iter_loaded())
+    for name in loaded - enabled:
+        hooks.Actions.PLUGIN_UNLOADED.do(name, Project.ROOT, config)
+    if enabled - loaded:
+        tutor.plugins.load_all(enabled - loaded)
+    Client.bump_plugins_generation()
+
+
+def command_path(args: list[str]) -> list[str]:
+    """
+    Return the names of the (sub)commands of a list of Tutor command arguments, without
+    their options. E.g: ["plugins", "install", "mfe"] for "tutor plugins install mfe".
+
+    Option values are detected from the definitions of the command options, such that
+    "config save -s KEY=VAL" results in ["config", "save"].
+    """
+    return Client.completion_engine().command_path(args)
@@ -2,24 +2,29 @@ import typing as t
 
 from tutordeck.server import constants
 
+T = t.TypeVar("T")
 
-def pagination_context(
-    plugins: list[dict[str, str]], current_page: int
-) -> dict[str, t.Any]:
-    total_pages = (
-        len(plugins) + constants.ITEMS_PER_PAGE - 1
-    ) // constants.ITEMS_PER_PAGE
-    return {
+
+def paginate(
+    items: t.Sequence[T], current_page: int, page_size: int = constants.ITEMS_PER_PAGE
+) -> tuple[t.Sequence[T], dict[str, t.Any]]:
+    """
+    Return the items of the current page, along with the pagination context.
+
+    Items should be the full list of filtered results, such that view models only need
+    to be built for the items of the current page. The current page and the page size
+    are clamped to valid values.
+    """
+    page_size = max(1, min(page_size, constants.MAX_ITEMS_PER_PAGE))
+    total_pages = max(1, (len(items) + page_size - 1) // page_size)
+    current_page = max(1, min(current_page, total_pages))
+    start_index = (current_page - 1) * page_size
+    end_index = start_index + page_size
+    return items[start_index:end_index], {
         "current_page": current_page,
+        "page_size": page_size,
         "total_pages": total_pages,
+        "results": len(items),
         "previous_page": current_page - 1 if current_page > 1 else None,
         "next_page": current_page + 1 if current_page < total_pages else None,
     }
-
-
-def current_page_plugins(
-    plugins: list[dict[str, str]], current_page: int
-) -> list[dict[str, str]]:
-    start_index = (current_page - 1) * constants.ITEMS_PER_PAGE
-    end_index = start_index + constants.ITEMS_PER_PAGE
-    return plugins[start_index:end_index]
@@ -0,0 +1,197 @@
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import sys
+import threading
+import traceback
+import typing as t
+
+from . import constants
+
+# Workers are stopped along with their child processes on POSIX platforms only
+HAS_PROCESS_GROUPS = hasattr(os, "setsid")
+
+# Message sent by workers once they are ready to run a command
+READY = "ready"
+
+
+class Worker:
+    """
+    Separate process that runs a single Tutor command.
+
+    Workers are started from a fresh interpreter ("spawn" start method), and import
+    tutor and discover plugins as soon as they are created, such that commands start
+    without delay. Commands do not share any state with the server process, such as the
+    hooks registry or the list of imported modules.
+
+    All output of the command, including the output of child processes, is streamed back
+    over a pipe. Each worker runs in its own process group, such that the command and all
+    its child processes can be killed at once.
+    """
+
+    def __init__(self) -> None:
+        context = multiprocessing.get_context("spawn")
+        self.control, child_control = context.Pipe()
+        # This pipe is only used to transfer raw bytes, so we bypass the connection
+        # API and use its file descriptors directly.
+        self.output, child_output = context.Pipe(duplex=False)
+        self.process = context.Process(
+            target=serve,
+            args=(child_control, child_output),
+            name="tutor-deck-worker",
+            daemon=True,
+        )
+        self.process.start()
+        child_control.close()
+        child_output.close()
+
+    def run(self, root: str, args: list[str]) -> tuple[int, str]:
+        """
+        Run a command and wait for its completion. Return the exit code and the error
+        message, if any. Output is not consumed: callers are expected to read it from
+        `output` in a separate thread.
+
+        Raise EOFError if the worker died before returning a result, for instance
+        because it was killed.
+        """
+        self.control.send((root, args))
+        while True:
+            message = self.control.recv()
+            if message != READY:
+                return t.cast(tuple[int, str], message)
+
+    def kill(self, force: bool = False) -> None:
+        """
+        Terminate the worker and all its child processes, or kill them if `force` is
+        True. Where process groups are not available, only the worker is stopped.
+        """
+        if self.process.pid is None:
+            return
+        if not HAS_PROCESS_GROUPS:
+            if force:
+                self.process.kill()
+            else:
+                self.process.terminate()
+            return
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL if force else signal.SIGTERM)
+        except (ProcessLookupError, PermissionError):
+            # Process group no longer exists
+            pass
+
+    def close(self, close_output: bool = True) -> None:
+        """
+        Kill the worker and all its child processes, and release its resources. Child
+        processes might still be running after the worker exited, so the process group
+        is always killed.
+
+        The output pipe must not be closed while another thread reads it, otherwise its
+        file descriptor might be reused while it is being read: in that case, the
+        reader is responsible for closing it.
+        """
+        self.kill(force=True)
+        self.process.join()
+        self.control.close()
+        if close_output:
+            self.output.close()
+
+    def iter_output(self) -> t.Iterator[bytes]:
+        """
+        Iterate on the output of the command, until all processes that write to the
+        pipe have exited.
+        """
+        fd = self.output.fileno()
+        while content := os.read(fd, constants.LOG_READ_CHUNK_BYTES):
+            yield content
+
+
+class WorkerPool:
+    """
+    Keep a spare worker ready to run the next command.
+
+    Workers are single-use: a new spare worker is started whenever one is acquired. The
+    spare worker must be recycled whenever plugin packages are installed or removed,
+    because it discovered plugins on start.
+    """
+
+    SPARE: t.Optional[Worker] = None
+    LOCK = threading.Lock()
+
+    @classmethod
+    def acquire(cls) -> Worker:
+        with cls.LOCK:
+            worker = cls.SPARE if cls.SPARE and cls.SPARE.process.is_alive() else None
+            cls.SPARE = Worker()
+        return worker or Worker()
+
+    @classmethod
+    def recycle(cls) -> None:
+        """
+        Replace the spare worker by a new one.
+        """
+        with cls.LOCK:
+            spare, cls.SPARE = cls.SPARE, Worker()
+        if spare:
+            spare.close()
+
+    @classmethod
+    def shutdown(cls) -> None:
+        with cls.LOCK:
+            spare, cls.SPARE = cls.SPARE, None
+        if spare:
+            spare.close()
+
+
+def serve(
+    control: multiprocessing.connection.Connection,
+    output: multiprocessing.connection.Connection,
+) -> None:
+    """
+    Worker process entrypoint: import tutor, then wait for a command and run it.
+    """
+    # Create a new process group, such that we can kill all child processes
+    if HAS_PROCESS_GROUPS:
+        os.setsid()
+
+    # pylint: disable=import-outside-toplevel
+    import tutor.commands.cli
+    from tutor import hooks
+    from tutor.exceptions import TutorError
+
+    # Discover plugins
+    hooks.Actions.CORE_READY.do()
+    control.send(READY)
+
+    try:
+        root, args = control.recv()
+    except EOFError:
+        # The server stopped before sending any command
+        return
+
+    # Redirect all output to the pipe, including the output of child processes
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.dup2(output.fileno(), 1)
+    os.dup2(output.fileno(), 2)
+    output.close()
+    sys.stdout.reconfigure(line_buffering=True)  # type: ignore[union-attr]
+
+    exit_code, error = 0, ""
+    try:
+        # pylint: disable=no-value-for-parameter
+        # Keep colors, even though the output is not a terminal
+        tutor.commands.cli.cli([f"--root={root}"] + args, color=True)
+    except TutorError as e:
+        exit_code, error = 1, e.args[0]
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            exit_code = e.code or 0
+        else:
+            exit_code = 1
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        traceback.print_exc()
+        exit_code, error = 1, f"Error: {e}"
+    sys.stdout.flush()
+    sys.stderr.flush()
+    control.send((exit_code, error))